@@ -1,3 +1,4 @@
 from . import db_store
 from . import routes
 from . import faker
+from . import geo
@@ -1,5 +1,8 @@
 from . import crud_utilities
+from . import credits_crud
 from . import user_crud
 from . import trips_crud
 from . import driver_crud
-from .db_manager import DatabaseManager
+from . import admin_crud
+from . import mod_crud
+from .db_manager import DatabaseManager, PoolExhausted
@@ -0,0 +1,127 @@
+# admin dashboard : reads rollup tables only (see ADMIN ROLLUPS in db_init.sql)
+import logging
+from datetime import datetime
+from app.db_store.crud_utilities import fetch_pipelined
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+DASHBOARD_DAYS = 30
+TOP_CITY_PAIRS = 10
+ACTIVE_DRIVER_DAYS = 30
+
+# one refresh at a time across every app process
+ROLLUP_LOCK_KEY = 7_310_020
+
+
+def get_dashboard(conn, days=DASHBOARD_DAYS, top=TOP_CITY_PAIRS):
+    # every figure in a single round-trip, cost independent of the data size
+    trips_daily, credits_daily, city_pairs, counters = fetch_pipelined(
+        conn,
+        [
+            (
+                "SELECT day, status, trips FROM stats_trips_daily WHERE day BETWEEN current_date - %s AND current_date + %s AND trips <> 0 ORDER BY day",
+                (days, days),
+            ),
+            (
+                "SELECT day, credits_issued, credits_spent, postings FROM stats_credits_daily WHERE day >= current_date - %s ORDER BY day",
+                (days,),
+            ),
+            (
+                "SELECT start_city, end_city, trips FROM stats_city_pairs WHERE trips > 0 ORDER BY trips DESC LIMIT %s",
+                (top,),
+            ),
+            ("SELECT name, value, refreshed_at FROM stats_counters", None),
+        ],
+    )
+
+    # {day: {status: trips}} for the per-day table
+    trips_by_day = {}
+    statuses = set()
+    for row in trips_daily:
+        trips_by_day.setdefault(row["day"], {})[row["status"]] = row["trips"]
+        statuses.add(row["status"])
+
+    return {
+        "trips_by_day": trips_by_day,
+        "trip_statuses": sorted(statuses),
+        "credits_daily": credits_daily,
+        "city_pairs": city_pairs,
+        "counters": {row["name"]: row["value"] for row in counters},
+        "refreshed_at": max((row["refreshed_at"] for row in counters), default=None),
+    }
+
+
+def refresh_counters(conn, active_days=ACTIVE_DRIVER_DAYS):
+    # window counters that no trigger can maintain, recomputed on a schedule
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (ROLLUP_LOCK_KEY,))
+            if not cur.fetchone()[0]:
+                conn.rollback()
+                return False
+            cur.execute(
+                """
+                INSERT INTO stats_counters (name, value)
+                VALUES
+                    ('active_drivers', (
+                        SELECT COUNT(DISTINCT driver_id) FROM trips
+                        WHERE start_time >= now() - make_interval(days => %s)
+                    )),
+                    ('drivers', (SELECT COUNT(*) FROM driver_data)),
+                    ('accounts', (SELECT COUNT(*) FROM accounts)),
+                    ('credits_in_circulation', (SELECT COALESCE(SUM(credits), 0) FROM users))
+                ON CONFLICT (name) DO UPDATE SET
+                    value = EXCLUDED.value,
+                    refreshed_at = now()
+                """,
+                (active_days,),
+            )
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def refresh_trips_daily(conn, days=DASHBOARD_DAYS):
+    # per day + status trip counts over the dashboard window, recomputed from
+    # trips (range scan on trips_start_time_idx) rather than kept by triggers,
+    # so trip writers never contend on the shared rollup rows
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (ROLLUP_LOCK_KEY,))
+            if not cur.fetchone()[0]:
+                conn.rollback()
+                return False
+            cur.execute(
+                "DELETE FROM stats_trips_daily WHERE day BETWEEN current_date - %s AND current_date + %s",
+                (days, days),
+            )
+            cur.execute(
+                """
+                INSERT INTO stats_trips_daily (day, status, trips)
+                SELECT t.start_time::date, s.name, COUNT(*)
+                FROM trips t JOIN trip_status s ON s.id = t.trip_status
+                WHERE t.start_time >= current_date - %s
+                  AND t.start_time < current_date + %s + 1
+                GROUP BY 1, 2
+                """,
+                (days, days),
+            )
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def refresh_rollups(db_manager):
+    # scheduled job body
+    started = datetime.now()
+    with db_manager.connection() as conn:
+        if refresh_counters(conn) and refresh_trips_daily(conn):
+            logger.info(
+                f"ADMIN STATS : rollups refreshed in {(datetime.now() - started).total_seconds():.2f}s"
+            )
+
@@ -0,0 +1,135 @@
+# credits ledger : append-only postings + batched settlement into users.credits
+import logging
+from psycopg.rows import dict_row
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+SETTLE_BATCH_SIZE = 5000
+
+# one settler at a time across every app process
+SETTLEMENT_LOCK_KEY = 7_310_019
+
+BALANCE_QUERY = """
+    SELECT u.credits + COALESCE(
+        (SELECT SUM(l.amount) FROM credit_ledger l
+         WHERE l.user_id = u.id AND l.settled_at IS NULL), 0
+    ) AS balance
+    FROM users u
+    WHERE u.id = %s
+"""
+
+
+def get_balance(conn, user_id):
+    with conn.cursor() as cur:
+        cur.execute(BALANCE_QUERY, (user_id,))
+        balance = cur.fetchone()
+        return balance[0] if balance else 0
+
+
+def lock_balance(conn, user_id):
+    # locks the user's snapshot row so concurrent debits of the same user
+    # serialize, then returns the spendable balance
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM users WHERE id = %s FOR UPDATE", (user_id,))
+        cur.execute(BALANCE_QUERY, (user_id,))
+        balance = cur.fetchone()
+        return balance[0] if balance else None
+
+
+def post_entries(conn, entries, commit=True):
+    # entries : [(user_id, amount, kind, trip_id, idempotency_key), ...]
+    # a key already posted is skipped, returns the number of new postings
+    entries = [entry for entry in entries if entry[1]]
+    if not entries:
+        return 0
+    user_ids, amounts, kinds, trip_ids, keys = map(list, zip(*entries))
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO credit_ledger (user_id, amount, kind, trip_id, idempotency_key)
+            SELECT * FROM unnest(%s::uuid[], %s::int[], %s::varchar[], %s::uuid[], %s::varchar[])
+            ON CONFLICT (idempotency_key) DO NOTHING
+            """,
+            (user_ids, amounts, kinds, trip_ids, keys),
+        )
+        posted = cur.rowcount
+    if commit:
+        conn.commit()
+    return posted
+
+
+def get_ledger(conn, user_id, limit=50):
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(
+            "SELECT amount, kind, trip_id, created_at, settled_at FROM credit_ledger WHERE user_id = %s ORDER BY id DESC LIMIT %s",
+            (user_id, limit),
+        )
+        return cur.fetchall()
+
+
+def settle_batch(conn, batch_size=SETTLE_BATCH_SIZE):
+    # folds the oldest unsettled postings into users.credits, one UPDATE per
+    # user whatever the number of postings, and into the daily credits
+    # rollup. Returns the postings settled.
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (SETTLEMENT_LOCK_KEY,))
+            if not cur.fetchone()[0]:
+                conn.rollback()
+                return 0
+            cur.execute(
+                """
+                WITH batch AS (
+                    SELECT id, user_id, amount FROM credit_ledger
+                    WHERE settled_at IS NULL
+                    ORDER BY id
+                    LIMIT %s
+                ), marked AS (
+                    UPDATE credit_ledger l SET settled_at = now()
+                    FROM batch b
+                    WHERE l.id = b.id
+                ), totals AS (
+                    UPDATE users u SET credits = u.credits + t.amount
+                    FROM (SELECT user_id, SUM(amount) AS amount FROM batch GROUP BY user_id) t
+                    WHERE u.id = t.user_id
+                ), rollup AS (
+                    -- admin dashboard figures, written by the single settler
+                    INSERT INTO stats_credits_daily AS sc (day, credits_issued, credits_spent, postings)
+                    SELECT
+                        l.created_at::date,
+                        COALESCE(SUM(b.amount) FILTER (WHERE b.amount > 0), 0),
+                        COALESCE(-SUM(b.amount) FILTER (WHERE b.amount < 0), 0),
+                        COUNT(*)
+                    FROM batch b
+                    JOIN credit_ledger l ON l.id = b.id
+                    GROUP BY 1
+                    ON CONFLICT (day) DO UPDATE SET
+                        credits_issued = sc.credits_issued + EXCLUDED.credits_issued,
+                        credits_spent = sc.credits_spent + EXCLUDED.credits_spent,
+                        postings = sc.postings + EXCLUDED.postings
+                )
+                SELECT COUNT(*) FROM batch
+                """,
+                (batch_size,),
+            )
+            settled = cur.fetchone()[0]
+        conn.commit()
+        return settled
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def settle_all(db_manager, batch_size=SETTLE_BATCH_SIZE):
+    # settlement job body : batches until the backlog is drained
+    total = 0
+    while True:
+        with db_manager.connection() as conn:
+            settled = settle_batch(conn, batch_size)
+        total += settled
+        if settled < batch_size:
+            break
+    if total:
+        logger.info(f"CREDITS : {total} ledger entries settled")
+    return total
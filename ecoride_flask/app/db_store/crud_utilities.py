@@ -26,6 +26,23 @@ def configure_conn(conn, schema_name):
         raise
 
 
+def fetch_pipelined(conn, queries):
+    # runs [(query, params), ...] in pipeline mode : every statement is sent
+    # before the first result is read, so the batch costs one round-trip.
+    # Returns one list of dict rows per query.
+    cursors = []
+    try:
+        with conn.pipeline():
+            for query, params in queries:
+                cur = conn.cursor(row_factory=dict_row)
+                cur.execute(query, params)
+                cursors.append(cur)
+        return [cur.fetchall() for cur in cursors]
+    finally:
+        for cur in cursors:
+            cur.close()
+
+
 STATIC_TABLES = [
     "account_access",
     "account_status",
@@ -86,7 +86,9 @@ INSERT INTO preferences (name) VALUES
 CREATE TABLE driver_data (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-    rating INTEGER DEFAULT 0 CHECK (rating >= 0 AND rating <= 5)
+    rating INTEGER DEFAULT 0 CHECK (rating >= 0 AND rating <= 5),
+    -- bumped when the rating, preferences or vehicles change (see DRIVER VERSION)
+    version BIGINT NOT NULL DEFAULT 1
 );
 
 CREATE TABLE driver_preferences (
@@ -206,17 +208,113 @@ EXECUTE FUNCTION update_timestamp();
 CREATE TABLE trip_passengers (
   trip_id UUID NOT NULL REFERENCES trips(id) ON DELETE CASCADE,
   user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  -- one per booking instance : keys the booking's ledger postings, so a
+  -- cancelled then rebooked seat is paid again
+  booking_id UUID NOT NULL DEFAULT gen_random_uuid() UNIQUE,
   PRIMARY KEY (trip_id, user_id)
 );
 
+-- SEAT COUNTERS
+-- one row per trip, kept up to date by the triggers below. Bookings lock this
+-- row and the CHECK makes overselling impossible whatever the write path.
+CREATE TABLE trip_seats (
+    trip_id UUID PRIMARY KEY REFERENCES trips(id) ON DELETE CASCADE,
+    capacity INTEGER NOT NULL,
+    booked INTEGER NOT NULL DEFAULT 0,
+    CHECK (booked >= 0 AND booked <= capacity)
+);
+
+-- trips created / moved to another vehicle -> capacity.
+-- Capacity is taken from the vehicle when the trip is created or changes
+-- vehicle, never resynced by other trip updates (status, rating, ...), which
+-- therefore cannot fail on seats. A move to a vehicle with fewer seats than
+-- the trip's bookings is rejected with an explicit error rather than clamped:
+-- it would strand booked passengers.
+CREATE OR REPLACE FUNCTION trip_seats_sync_trips()
+RETURNS TRIGGER AS $$
+DECLARE
+  overbooked UUID;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO trip_seats (trip_id, capacity)
+    SELECT n.id, v.number_of_seats
+    FROM new_trips n
+    JOIN vehicles v ON v.id = n.vehicle_id;
+    RETURN NULL;
+  END IF;
+
+  SELECT s.trip_id INTO overbooked
+  FROM new_trips n
+  JOIN old_trips o ON o.id = n.id
+  JOIN vehicles v ON v.id = n.vehicle_id
+  JOIN trip_seats s ON s.trip_id = n.id
+  WHERE n.vehicle_id IS DISTINCT FROM o.vehicle_id AND v.number_of_seats < s.booked
+  LIMIT 1;
+  IF FOUND THEN
+    RAISE EXCEPTION 'trip % has more bookings than the new vehicle has seats', overbooked
+      USING ERRCODE = 'check_violation', CONSTRAINT = 'trip_seats_capacity_below_booked',
+            HINT = 'cancel bookings first or pick a vehicle with enough seats';
+  END IF;
+
+  UPDATE trip_seats s SET capacity = v.number_of_seats
+  FROM new_trips n
+  JOIN old_trips o ON o.id = n.id
+  JOIN vehicles v ON v.id = n.vehicle_id
+  WHERE s.trip_id = n.id
+    AND n.vehicle_id IS DISTINCT FROM o.vehicle_id
+    AND s.capacity IS DISTINCT FROM v.number_of_seats;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trip_seats_trips_insert
+AFTER INSERT ON trips
+REFERENCING NEW TABLE AS new_trips
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_seats_sync_trips();
+
+-- same-event triggers fire in name order : this one must run before
+-- trip_search_trips_update, which reads the resulting capacity
+CREATE TRIGGER trip_capacity_trips_update
+AFTER UPDATE ON trips
+REFERENCING OLD TABLE AS old_trips NEW TABLE AS new_trips
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_seats_sync_trips();
+
+-- passengers added / removed -> booked, by per-trip delta
+CREATE OR REPLACE FUNCTION trip_seats_sync_passengers()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    UPDATE trip_seats s SET booked = s.booked + c.n
+    FROM (SELECT trip_id, COUNT(*) AS n FROM new_passengers GROUP BY trip_id) c
+    WHERE s.trip_id = c.trip_id;
+  ELSE
+    UPDATE trip_seats s SET booked = s.booked - c.n
+    FROM (SELECT trip_id, COUNT(*) AS n FROM old_passengers GROUP BY trip_id) c
+    WHERE s.trip_id = c.trip_id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trip_seats_passengers_insert
+AFTER INSERT ON trip_passengers
+REFERENCING NEW TABLE AS new_passengers
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_seats_sync_passengers();
+
+CREATE TRIGGER trip_seats_passengers_delete
+AFTER DELETE ON trip_passengers
+REFERENCING OLD TABLE AS old_passengers
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_seats_sync_passengers();
+
 CREATE OR REPLACE VIEW trip_available_seats AS
 SELECT
-  t.id AS trip_id,
-  v.number_of_seats - COUNT(tp.user_id) AS available_seats
-FROM trips t
-JOIN vehicles v ON v.id = t.vehicle_id
-LEFT JOIN trip_passengers tp ON tp.trip_id = t.id
-GROUP BY t.id, v.number_of_seats;
+  trip_id,
+  capacity - booked AS available_seats
+FROM trip_seats;
 
 CREATE TABLE review_status (
   id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -235,6 +333,10 @@ CREATE TABLE reviews (
     rating INTEGER CHECK (rating >= 0 AND rating <= 5) NOT NULL,
     comments TEXT,
     review_status_id UUID NOT NULL REFERENCES review_status(id) ON DELETE CASCADE,
+    -- moderation lease : the moderator working on the review, until expiry
+    claimed_by UUID NULL REFERENCES accounts(id) ON DELETE SET NULL,
+    -- compared with now() : timestamptz, whatever the session TimeZone
+    claim_expires_at TIMESTAMPTZ NULL,
     created_at TIMESTAMP DEFAULT now(),
     updated_at TIMESTAMP DEFAULT now()
 );
@@ -252,9 +354,27 @@ BEFORE UPDATE ON reviews
 FOR EACH ROW
 EXECUTE FUNCTION update_timestamp();
 
+-- moderation queue : only pending reviews are ever scanned, in arrival order.
+-- The status is a generated uuid, so the predicate is built once it exists.
+DO $$
+BEGIN
+  EXECUTE format(
+    'CREATE INDEX reviews_pending_idx ON reviews (created_at, id) WHERE review_status_id = %L',
+    (SELECT id FROM review_status WHERE name = 'pending')
+  );
+END;
+$$;
+
+CREATE INDEX reviews_claimed_by_idx ON reviews (claimed_by)
+WHERE claimed_by IS NOT NULL;
+
 CREATE TABLE trip_summaries (
     trip_id UUID PRIMARY KEY REFERENCES trips(id) ON DELETE CASCADE,
     summary JSONB NOT NULL,
+    -- trips_crud.SUMMARY_VERSION that built the row, and a hash of its
+    -- content : regeneration rewrites only outdated or changed summaries
+    summary_version SMALLINT NOT NULL DEFAULT 0,
+    content_hash VARCHAR(32) NULL,
     created_at TIMESTAMP DEFAULT now()
 );
 
@@ -265,7 +385,7 @@ SELECT
   s.name AS status,
   ts.summary
 FROM trips t
-JOIN trip_status s ON t.status_id = s.id
+JOIN trip_status s ON t.trip_status = s.id
 LEFT JOIN trip_summaries ts ON ts.trip_id = t.id;
 
 CREATE OR REPLACE VIEW trip_summaries_asst AS
@@ -277,3 +397,714 @@ SELECT
   tas.available_seats
 FROM trip_with_status_and_summary twss
 JOIN trip_available_seats tas ON twss.trip_id = tas.trip_id;
+
+
+-- SEARCH TABLE
+-- typed, denormalized copy of every summarized trip, so the search page
+-- filters on indexed columns instead of JSONB and the seats view.
+-- rows are created from trip_summaries and kept in sync by the triggers below.
+CREATE TABLE trip_search (
+    trip_id UUID PRIMARY KEY REFERENCES trips(id) ON DELETE CASCADE,
+    driver_id UUID NOT NULL REFERENCES driver_data(id) ON DELETE CASCADE,
+    start_city VARCHAR(100) NOT NULL,
+    end_city VARCHAR(100) NOT NULL,
+    start_time TIMESTAMP NOT NULL,
+    price INTEGER NOT NULL,
+    available_seats INTEGER NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    summary JSONB NOT NULL,
+    -- bumped on every update : rendered trip cards are cached per version
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION bump_row_version()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.version = OLD.version + 1;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trip_search_version
+BEFORE UPDATE ON trip_search
+FOR EACH ROW
+EXECUTE FUNCTION bump_row_version();
+
+-- partial indexes: search only ever looks at bookable trips
+CREATE INDEX trip_search_route_idx ON trip_search (start_city, end_city, start_time, trip_id)
+WHERE status IN ('pending', 'upcoming');
+
+CREATE INDEX trip_search_start_city_idx ON trip_search (start_city, start_time, trip_id)
+WHERE status IN ('pending', 'upcoming');
+
+CREATE INDEX trip_search_end_city_idx ON trip_search (end_city, start_time, trip_id)
+WHERE status IN ('pending', 'upcoming');
+
+CREATE INDEX trip_search_start_time_idx ON trip_search (start_time, trip_id)
+WHERE status IN ('pending', 'upcoming');
+
+-- summaries written (insert or upsert) -> (re)build the search rows
+CREATE OR REPLACE FUNCTION trip_search_sync_summaries()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO trip_search (
+    trip_id, driver_id, start_city, end_city,
+    start_time, price, available_seats, status, summary
+  )
+  SELECT
+    t.id,
+    t.driver_id,
+    n.summary->>'start_city',
+    n.summary->>'end_city',
+    t.start_time,
+    t.price,
+    COALESCE(seats.capacity - seats.booked, v.number_of_seats),
+    s.name,
+    n.summary
+  FROM new_summaries n
+  JOIN trips t ON t.id = n.trip_id
+  JOIN vehicles v ON v.id = t.vehicle_id
+  JOIN trip_status s ON s.id = t.trip_status
+  LEFT JOIN trip_seats seats ON seats.trip_id = t.id
+  ON CONFLICT (trip_id) DO UPDATE SET
+    driver_id = EXCLUDED.driver_id,
+    start_city = EXCLUDED.start_city,
+    end_city = EXCLUDED.end_city,
+    start_time = EXCLUDED.start_time,
+    price = EXCLUDED.price,
+    available_seats = EXCLUDED.available_seats,
+    status = EXCLUDED.status,
+    summary = EXCLUDED.summary,
+    updated_at = now()
+  -- summaries rewritten identically (e.g. a new SUMMARY_VERSION) leave the
+  -- search row, its version and the caches alone
+  WHERE (
+    trip_search.driver_id, trip_search.start_city, trip_search.end_city,
+    trip_search.start_time, trip_search.price, trip_search.available_seats,
+    trip_search.status, trip_search.summary
+  ) IS DISTINCT FROM (
+    EXCLUDED.driver_id, EXCLUDED.start_city, EXCLUDED.end_city,
+    EXCLUDED.start_time, EXCLUDED.price, EXCLUDED.available_seats,
+    EXCLUDED.status, EXCLUDED.summary
+  );
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trip_search_summaries_insert
+AFTER INSERT ON trip_summaries
+REFERENCING NEW TABLE AS new_summaries
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_search_sync_summaries();
+
+CREATE TRIGGER trip_search_summaries_update
+AFTER UPDATE ON trip_summaries
+REFERENCING NEW TABLE AS new_summaries
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_search_sync_summaries();
+
+-- trips updated -> refresh typed columns and the summary fields they shadow.
+-- Seats come from trip_seats, already resynced by trip_capacity_trips_update.
+-- Updates touching no searched column leave the row, its version and the
+-- caches alone.
+CREATE OR REPLACE FUNCTION trip_search_sync_trips()
+RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE trip_search ts SET
+    driver_id = c.driver_id,
+    start_time = c.start_time,
+    price = c.price,
+    status = c.status,
+    available_seats = c.available_seats,
+    summary = c.summary,
+    updated_at = now()
+  FROM (
+    SELECT
+      n.id,
+      n.driver_id,
+      n.start_time,
+      n.price,
+      s.name AS status,
+      COALESCE(seats.capacity - seats.booked, v.number_of_seats) AS available_seats,
+      ts.summary || jsonb_build_object(
+        'start_time', to_char(n.start_time, 'YYYY-MM-DD"T"HH24:MI:SS'),
+        'price', n.price
+      ) AS summary
+    FROM new_trips n
+    JOIN trip_search ts ON ts.trip_id = n.id
+    JOIN trip_status s ON s.id = n.trip_status
+    JOIN vehicles v ON v.id = n.vehicle_id
+    LEFT JOIN trip_seats seats ON seats.trip_id = n.id
+  ) c
+  WHERE ts.trip_id = c.id
+    AND (ts.driver_id, ts.start_time, ts.price, ts.status, ts.available_seats, ts.summary)
+        IS DISTINCT FROM
+        (c.driver_id, c.start_time, c.price, c.status, c.available_seats, c.summary);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trip_search_trips_update
+AFTER UPDATE ON trips
+REFERENCING NEW TABLE AS new_trips
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_search_sync_trips();
+
+-- passengers added / removed -> adjust seats by the per-trip delta
+CREATE OR REPLACE FUNCTION trip_search_sync_passengers()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    UPDATE trip_search ts SET
+      available_seats = ts.available_seats - c.n,
+      updated_at = now()
+    FROM (SELECT trip_id, COUNT(*) AS n FROM new_passengers GROUP BY trip_id) c
+    WHERE ts.trip_id = c.trip_id;
+  ELSE
+    UPDATE trip_search ts SET
+      available_seats = ts.available_seats + c.n,
+      updated_at = now()
+    FROM (SELECT trip_id, COUNT(*) AS n FROM old_passengers GROUP BY trip_id) c
+    WHERE ts.trip_id = c.trip_id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trip_search_passengers_insert
+AFTER INSERT ON trip_passengers
+REFERENCING NEW TABLE AS new_passengers
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_search_sync_passengers();
+
+CREATE TRIGGER trip_search_passengers_delete
+AFTER DELETE ON trip_passengers
+REFERENCING OLD TABLE AS old_passengers
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_search_sync_passengers();
+
+
+-- DRIVER RATINGS
+-- running sum / count / histogram (index 1..5 = stars) per driver, fed by
+-- rated trips and approved reviews. Triggers apply per-statement deltas, so a
+-- new rating costs the same whatever the driver's history.
+CREATE TABLE driver_rating_stats (
+    driver_id UUID PRIMARY KEY REFERENCES driver_data(id) ON DELETE CASCADE,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    histogram INTEGER[] NOT NULL DEFAULT '{0,0,0,0,0}',
+    updated_at TIMESTAMP DEFAULT now()
+);
+
+CREATE INDEX trip_search_driver_idx ON trip_search (driver_id);
+
+-- (driver, stars, +n / -n) deltas -> stats, then driver_data.rating when the
+-- rounded average moves
+CREATE OR REPLACE FUNCTION driver_rating_apply(
+  p_driver_ids UUID[], p_ratings INTEGER[], p_counts INTEGER[]
+)
+RETURNS VOID AS $$
+BEGIN
+  IF p_driver_ids IS NULL THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO driver_rating_stats AS s (driver_id, rating_sum, rating_count, histogram)
+  SELECT
+    driver_id,
+    SUM(rating * n),
+    SUM(n),
+    ARRAY[
+      COALESCE(SUM(n) FILTER (WHERE rating = 1), 0),
+      COALESCE(SUM(n) FILTER (WHERE rating = 2), 0),
+      COALESCE(SUM(n) FILTER (WHERE rating = 3), 0),
+      COALESCE(SUM(n) FILTER (WHERE rating = 4), 0),
+      COALESCE(SUM(n) FILTER (WHERE rating = 5), 0)
+    ]::int[]
+  FROM unnest(p_driver_ids, p_ratings, p_counts) AS d(driver_id, rating, n)
+  GROUP BY driver_id
+  ON CONFLICT (driver_id) DO UPDATE SET
+    rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+    rating_count = s.rating_count + EXCLUDED.rating_count,
+    histogram = ARRAY(
+      SELECT a + b FROM unnest(s.histogram, EXCLUDED.histogram) AS h(a, b)
+    ),
+    updated_at = now();
+
+  UPDATE driver_data dd SET
+    rating = r.rating
+  FROM (
+    SELECT driver_id, COALESCE(ROUND(rating_sum::numeric / NULLIF(rating_count, 0)), 0)::int AS rating
+    FROM driver_rating_stats
+    WHERE driver_id = ANY(p_driver_ids)
+  ) r
+  WHERE dd.id = r.driver_id AND dd.rating IS DISTINCT FROM r.rating;
+END;
+$$ LANGUAGE plpgsql;
+
+-- trips rated / unrated / deleted
+CREATE OR REPLACE FUNCTION driver_rating_sync_trips()
+RETURNS TRIGGER AS $$
+DECLARE
+  d_ids UUID[];
+  d_ratings INTEGER[];
+  d_counts INTEGER[];
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    SELECT array_agg(driver_id), array_agg(rating), array_agg(n)
+    INTO d_ids, d_ratings, d_counts
+    FROM (
+      SELECT driver_id, rating, COUNT(*)::int AS n
+      FROM new_trips WHERE rating BETWEEN 1 AND 5
+      GROUP BY driver_id, rating
+    ) d;
+  ELSIF TG_OP = 'DELETE' THEN
+    SELECT array_agg(driver_id), array_agg(rating), array_agg(n)
+    INTO d_ids, d_ratings, d_counts
+    FROM (
+      SELECT driver_id, rating, -COUNT(*)::int AS n
+      FROM old_trips WHERE rating BETWEEN 1 AND 5
+      GROUP BY driver_id, rating
+    ) d;
+  ELSE
+    -- unchanged ratings cancel out
+    SELECT array_agg(driver_id), array_agg(rating), array_agg(n)
+    INTO d_ids, d_ratings, d_counts
+    FROM (
+      SELECT driver_id, rating, SUM(n)::int AS n
+      FROM (
+        SELECT driver_id, rating, 1 AS n FROM new_trips WHERE rating BETWEEN 1 AND 5
+        UNION ALL
+        SELECT driver_id, rating, -1 FROM old_trips WHERE rating BETWEEN 1 AND 5
+      ) c
+      GROUP BY driver_id, rating
+      HAVING SUM(n) <> 0
+    ) d;
+  END IF;
+
+  PERFORM driver_rating_apply(d_ids, d_ratings, d_counts);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER driver_rating_trips_insert
+AFTER INSERT ON trips
+REFERENCING NEW TABLE AS new_trips
+FOR EACH STATEMENT
+EXECUTE FUNCTION driver_rating_sync_trips();
+
+CREATE TRIGGER driver_rating_trips_update
+AFTER UPDATE ON trips
+REFERENCING OLD TABLE AS old_trips NEW TABLE AS new_trips
+FOR EACH STATEMENT
+EXECUTE FUNCTION driver_rating_sync_trips();
+
+CREATE TRIGGER driver_rating_trips_delete
+AFTER DELETE ON trips
+REFERENCING OLD TABLE AS old_trips
+FOR EACH STATEMENT
+EXECUTE FUNCTION driver_rating_sync_trips();
+
+-- reviews count once approved, and stop counting when they leave that status
+CREATE OR REPLACE FUNCTION driver_rating_sync_reviews()
+RETURNS TRIGGER AS $$
+DECLARE
+  d_ids UUID[];
+  d_ratings INTEGER[];
+  d_counts INTEGER[];
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    SELECT array_agg(driver_id), array_agg(rating), array_agg(n)
+    INTO d_ids, d_ratings, d_counts
+    FROM (
+      SELECT t.driver_id, r.rating, COUNT(*)::int AS n
+      FROM new_reviews r
+      JOIN trips t ON t.id = r.trip_id
+      JOIN review_status rs ON rs.id = r.review_status_id AND rs.name = 'approved'
+      WHERE r.rating BETWEEN 1 AND 5
+      GROUP BY t.driver_id, r.rating
+    ) d;
+  ELSIF TG_OP = 'DELETE' THEN
+    SELECT array_agg(driver_id), array_agg(rating), array_agg(n)
+    INTO d_ids, d_ratings, d_counts
+    FROM (
+      SELECT t.driver_id, r.rating, -COUNT(*)::int AS n
+      FROM old_reviews r
+      JOIN trips t ON t.id = r.trip_id
+      JOIN review_status rs ON rs.id = r.review_status_id AND rs.name = 'approved'
+      WHERE r.rating BETWEEN 1 AND 5
+      GROUP BY t.driver_id, r.rating
+    ) d;
+  ELSE
+    SELECT array_agg(driver_id), array_agg(rating), array_agg(n)
+    INTO d_ids, d_ratings, d_counts
+    FROM (
+      SELECT t.driver_id, c.rating, SUM(c.n)::int AS n
+      FROM (
+        SELECT trip_id, rating, review_status_id, 1 AS n FROM new_reviews
+        UNION ALL
+        SELECT trip_id, rating, review_status_id, -1 FROM old_reviews
+      ) c
+      JOIN trips t ON t.id = c.trip_id
+      JOIN review_status rs ON rs.id = c.review_status_id AND rs.name = 'approved'
+      WHERE c.rating BETWEEN 1 AND 5
+      GROUP BY t.driver_id, c.rating
+      HAVING SUM(c.n) <> 0
+    ) d;
+  END IF;
+
+  PERFORM driver_rating_apply(d_ids, d_ratings, d_counts);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER driver_rating_reviews_insert
+AFTER INSERT ON reviews
+REFERENCING NEW TABLE AS new_reviews
+FOR EACH STATEMENT
+EXECUTE FUNCTION driver_rating_sync_reviews();
+
+CREATE TRIGGER driver_rating_reviews_update
+AFTER UPDATE ON reviews
+REFERENCING OLD TABLE AS old_reviews NEW TABLE AS new_reviews
+FOR EACH STATEMENT
+EXECUTE FUNCTION driver_rating_sync_reviews();
+
+CREATE TRIGGER driver_rating_reviews_delete
+AFTER DELETE ON reviews
+REFERENCING OLD TABLE AS old_reviews
+FOR EACH STATEMENT
+EXECUTE FUNCTION driver_rating_sync_reviews();
+
+-- driver rating changed -> re-stamp that driver's search rows
+CREATE OR REPLACE FUNCTION trip_search_sync_driver_rating()
+RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE trip_search ts SET
+    summary = ts.summary || jsonb_build_object('driver_rating', n.rating),
+    updated_at = now()
+  FROM new_drivers n
+  JOIN old_drivers o ON o.id = n.id
+  WHERE ts.driver_id = n.id AND n.rating IS DISTINCT FROM o.rating;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trip_search_driver_rating_update
+AFTER UPDATE ON driver_data
+REFERENCING OLD TABLE AS old_drivers NEW TABLE AS new_drivers
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_search_sync_driver_rating();
+
+-- rebuilds one driver's stats from scratch (repair after bulk edits / deletes)
+CREATE OR REPLACE FUNCTION driver_rating_resync(p_driver_id UUID)
+RETURNS INTEGER AS $$
+DECLARE
+  new_rating INTEGER;
+BEGIN
+  INSERT INTO driver_rating_stats AS s (driver_id, rating_sum, rating_count, histogram)
+  SELECT
+    p_driver_id,
+    COALESCE(SUM(rating), 0),
+    COUNT(*),
+    ARRAY[
+      COUNT(*) FILTER (WHERE rating = 1),
+      COUNT(*) FILTER (WHERE rating = 2),
+      COUNT(*) FILTER (WHERE rating = 3),
+      COUNT(*) FILTER (WHERE rating = 4),
+      COUNT(*) FILTER (WHERE rating = 5)
+    ]::int[]
+  FROM (
+    SELECT rating FROM trips
+    WHERE driver_id = p_driver_id AND rating BETWEEN 1 AND 5
+    UNION ALL
+    SELECT r.rating FROM reviews r
+    JOIN trips t ON t.id = r.trip_id
+    JOIN review_status rs ON rs.id = r.review_status_id AND rs.name = 'approved'
+    WHERE t.driver_id = p_driver_id AND r.rating BETWEEN 1 AND 5
+  ) x
+  ON CONFLICT (driver_id) DO UPDATE SET
+    rating_sum = EXCLUDED.rating_sum,
+    rating_count = EXCLUDED.rating_count,
+    histogram = EXCLUDED.histogram,
+    updated_at = now();
+
+  SELECT COALESCE(ROUND(rating_sum::numeric / NULLIF(rating_count, 0)), 0)::int
+  INTO new_rating
+  FROM driver_rating_stats WHERE driver_id = p_driver_id;
+
+  UPDATE driver_data SET rating = new_rating
+  WHERE id = p_driver_id AND rating IS DISTINCT FROM new_rating;
+  RETURN new_rating;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- CREDITS LEDGER
+-- append-only postings. users.credits is the settled snapshot, the balance is
+-- snapshot + unsettled postings; the settlement job folds postings into the
+-- snapshot in batches, so bookings never update a (popular) driver's row.
+CREATE TABLE credit_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    amount INTEGER NOT NULL CHECK (amount <> 0),
+    kind VARCHAR(30) NOT NULL,
+    trip_id UUID NULL REFERENCES trips(id) ON DELETE SET NULL,
+    idempotency_key VARCHAR(120) UNIQUE NOT NULL,
+    created_at TIMESTAMP DEFAULT now(),
+    settled_at TIMESTAMP NULL
+);
+
+CREATE INDEX credit_ledger_unsettled_idx ON credit_ledger (user_id, id)
+WHERE settled_at IS NULL;
+
+
+-- ADMIN ROLLUPS
+-- the admin dashboard only reads these. City-pair counts follow trip_search
+-- through statement triggers; daily trip counts, credits and window
+-- counters (active drivers, ...) are folded in by the scheduled
+-- admin_crud.refresh_rollups job so booking traffic never touches them.
+CREATE TABLE stats_trips_daily (
+    day DATE NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    trips INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, status)
+);
+
+CREATE TABLE stats_city_pairs (
+    start_city VARCHAR(100) NOT NULL,
+    end_city VARCHAR(100) NOT NULL,
+    trips INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (start_city, end_city)
+);
+
+CREATE INDEX stats_city_pairs_top_idx ON stats_city_pairs (trips DESC);
+
+CREATE TABLE stats_credits_daily (
+    day DATE PRIMARY KEY,
+    credits_issued BIGINT NOT NULL DEFAULT 0,
+    credits_spent BIGINT NOT NULL DEFAULT 0,
+    postings INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE stats_counters (
+    name VARCHAR(50) PRIMARY KEY,
+    value BIGINT NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT now()
+);
+
+-- per day + status trip counts are recomputed by the scheduled job over the
+-- dashboard window : concurrent trip writers (and parallel seed loaders)
+-- never queue on the shared (day, status) rows
+CREATE INDEX trips_start_time_idx ON trips (start_time);
+
+-- search rows carry the resolved cities -> city pair counts
+CREATE OR REPLACE FUNCTION stats_sync_city_pairs()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO stats_city_pairs AS sp (start_city, end_city, trips)
+    SELECT start_city, end_city, COUNT(*) FROM new_search GROUP BY 1, 2
+    -- deterministic lock order between concurrent writers
+    ORDER BY 1, 2
+    ON CONFLICT (start_city, end_city) DO UPDATE SET trips = sp.trips + EXCLUDED.trips;
+  ELSIF TG_OP = 'DELETE' THEN
+    UPDATE stats_city_pairs sp SET trips = sp.trips - c.n
+    FROM (SELECT start_city, end_city, COUNT(*) AS n FROM old_search GROUP BY 1, 2) c
+    WHERE sp.start_city = c.start_city AND sp.end_city = c.end_city;
+  ELSE
+    -- seat / price updates cancel out without writing
+    INSERT INTO stats_city_pairs AS sp (start_city, end_city, trips)
+    SELECT start_city, end_city, SUM(n)
+    FROM (
+      SELECT start_city, end_city, 1 AS n FROM new_search
+      UNION ALL
+      SELECT start_city, end_city, -1 FROM old_search
+    ) c
+    GROUP BY start_city, end_city
+    HAVING SUM(n) <> 0
+    ORDER BY start_city, end_city
+    ON CONFLICT (start_city, end_city) DO UPDATE SET trips = sp.trips + EXCLUDED.trips;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER stats_city_pairs_insert
+AFTER INSERT ON trip_search
+REFERENCING NEW TABLE AS new_search
+FOR EACH STATEMENT
+EXECUTE FUNCTION stats_sync_city_pairs();
+
+CREATE TRIGGER stats_city_pairs_update
+AFTER UPDATE ON trip_search
+REFERENCING OLD TABLE AS old_search NEW TABLE AS new_search
+FOR EACH STATEMENT
+EXECUTE FUNCTION stats_sync_city_pairs();
+
+CREATE TRIGGER stats_city_pairs_delete
+AFTER DELETE ON trip_search
+REFERENCING OLD TABLE AS old_search
+FOR EACH STATEMENT
+EXECUTE FUNCTION stats_sync_city_pairs();
+
+
+-- SESSION USER CACHE
+-- app processes cache logged-in users and LISTEN on session_user_changed :
+-- a status, access, email or username change drops the account everywhere
+-- (payload = account id), not only in the process that wrote it.
+CREATE OR REPLACE FUNCTION session_user_notify()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_TABLE_NAME = 'accounts' THEN
+    PERFORM pg_notify('session_user_changed', NEW.id::text);
+  ELSE
+    PERFORM pg_notify('session_user_changed', NEW.account_id::text);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER session_user_accounts_update
+AFTER UPDATE ON accounts
+FOR EACH ROW
+WHEN (
+  (OLD.account_status_id, OLD.account_access_id, OLD.email)
+  IS DISTINCT FROM (NEW.account_status_id, NEW.account_access_id, NEW.email)
+)
+EXECUTE FUNCTION session_user_notify();
+
+CREATE TRIGGER session_user_users_update
+AFTER UPDATE ON users
+FOR EACH ROW
+WHEN (OLD.username IS DISTINCT FROM NEW.username)
+EXECUTE FUNCTION session_user_notify();
+
+
+-- SEARCH CACHE
+-- app processes cache search results and LISTEN on trip_search_changed.
+-- Trip, passenger, summary and rating writes all end up in trip_search, so
+-- one notification per changing transaction keeps every cache current.
+-- Statements that change no row stay silent.
+-- The payload is the search generation, drawn once per changing transaction
+-- from a sequence (no row lock, writers never queue on it) and shared by
+-- every process : it is the ETag of search results. Transactions may commit
+-- out of generation order, SearchCache folds late generations into its
+-- validator.
+CREATE SEQUENCE trip_search_generation_seq;
+
+CREATE OR REPLACE FUNCTION trip_search_notify()
+RETURNS TRIGGER AS $$
+DECLARE
+  current_generation TEXT;
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    PERFORM 1 FROM old_search LIMIT 1;
+  ELSE
+    PERFORM 1 FROM new_search LIMIT 1;
+  END IF;
+  IF FOUND THEN
+    -- later statements of the same transaction keep its generation, so
+    -- their identical notifications fold into one
+    current_generation := NULLIF(current_setting('ecoride.search_generation', true), '');
+    IF current_generation IS NULL THEN
+      current_generation := nextval('trip_search_generation_seq')::text;
+      PERFORM set_config('ecoride.search_generation', current_generation, true);
+    END IF;
+    PERFORM pg_notify('trip_search_changed', current_generation);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trip_search_notify_insert
+AFTER INSERT ON trip_search
+REFERENCING NEW TABLE AS new_search
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_search_notify();
+
+CREATE TRIGGER trip_search_notify_update
+AFTER UPDATE ON trip_search
+REFERENCING OLD TABLE AS old_search NEW TABLE AS new_search
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_search_notify();
+
+CREATE TRIGGER trip_search_notify_delete
+AFTER DELETE ON trip_search
+REFERENCING OLD TABLE AS old_search
+FOR EACH STATEMENT
+EXECUTE FUNCTION trip_search_notify();
+
+
+-- DRIVER VERSION
+-- validator of the driver info fragment (ETag) : the row's own updates and
+-- every preference / vehicle change bump driver_data.version
+CREATE TRIGGER driver_data_version
+BEFORE UPDATE ON driver_data
+FOR EACH ROW
+EXECUTE FUNCTION bump_row_version();
+
+-- statements that change nothing (the no-op halves of the diff writers in
+-- driver_crud, updates rewriting identical values) leave the version, and
+-- so the ETag, alone
+CREATE OR REPLACE FUNCTION driver_data_touch()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    IF NOT EXISTS (SELECT 1 FROM new_rows) THEN
+      RETURN NULL;
+    END IF;
+    UPDATE driver_data d SET version = d.version + 1
+    WHERE d.id IN (SELECT driver_id FROM new_rows);
+  ELSIF TG_OP = 'DELETE' THEN
+    IF NOT EXISTS (SELECT 1 FROM old_rows) THEN
+      RETURN NULL;
+    END IF;
+    UPDATE driver_data d SET version = d.version + 1
+    WHERE d.id IN (SELECT driver_id FROM old_rows);
+  ELSE
+    -- only rows whose content actually changed (update triggers are on
+    -- tables keyed by id)
+    UPDATE driver_data d SET version = d.version + 1
+    WHERE d.id IN (
+      SELECT n.driver_id FROM new_rows n JOIN old_rows o ON o.id = n.id
+      WHERE ROW(o.*) IS DISTINCT FROM ROW(n.*)
+      UNION
+      SELECT o.driver_id FROM new_rows n JOIN old_rows o ON o.id = n.id
+      WHERE ROW(o.*) IS DISTINCT FROM ROW(n.*)
+    );
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER driver_preferences_touch_insert
+AFTER INSERT ON driver_preferences
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION driver_data_touch();
+
+CREATE TRIGGER driver_preferences_touch_delete
+AFTER DELETE ON driver_preferences
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION driver_data_touch();
+
+CREATE TRIGGER vehicles_touch_insert
+AFTER INSERT ON vehicles
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION driver_data_touch();
+
+CREATE TRIGGER vehicles_touch_update
+AFTER UPDATE ON vehicles
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION driver_data_touch();
+
+CREATE TRIGGER vehicles_touch_delete
+AFTER DELETE ON vehicles
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION driver_data_touch();
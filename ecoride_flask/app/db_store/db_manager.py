@@ -1,17 +1,61 @@
-from psycopg_pool import pool
+from psycopg import pq
+from psycopg_pool import pool, PoolTimeout
 from contextlib import contextmanager
+from flask import g, has_app_context, has_request_context, request
+import heapq
+import logging
+import threading
+import time
+from app.utils.metrics import LatencyHistogram
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+# how many of the longest checkouts are kept for /auth/metrics
+SLOW_HOLDERS_KEPT = 20
+
+
+class PoolExhausted(Exception):
+    def __init__(self, timeout, retry_after=1):
+        super().__init__(f"no database connection available after {timeout}s")
+        self.timeout = timeout
+        self.retry_after = retry_after
 
 
 class DatabaseManager:
     def __init__(self, db_config):
+        self.conninfo = f"postgresql://{db_config['db_user']}:{db_config['db_password']}@{db_config['db_host']}:{db_config['db_port']}/{db_config['db_name']}"
         self.pool = pool.ConnectionPool(
             min_size=db_config["min_conn"],
             max_size=db_config["max_conn"],
-            conninfo=f"postgresql://{db_config['db_user']}:{db_config['db_password']}@{db_config['db_host']}:{db_config['db_port']}/{db_config['db_name']}",
+            conninfo=self.conninfo,
+            # connections go back to the pool with autocommit off, whatever
+            # the previous borrower set
+            reset=self._reset,
         )
+        self.acquire_timeout = db_config.get("acquire_timeout", 30)
+        self.slow_hold_ms = db_config.get("slow_hold_ms", 500)
+
+        self.wait_latency = LatencyHistogram()
+        self.hold_latency = LatencyHistogram()
+        self.timeouts = 0
+        self._slow_holders = []  # min-heap of (hold_ms, at, holder)
+        self._lock = threading.Lock()
 
-    def get_conn(self):
-        return self.pool.getconn()
+    def get_conn(self, timeout=None):
+        started = time.perf_counter()
+        try:
+            conn = self.pool.getconn(timeout=timeout or self.acquire_timeout)
+        except PoolTimeout:
+            with self._lock:
+                self.timeouts += 1
+            logger.warning(
+                f"DB POOL : acquire timed out for {self._holder()} "
+                f"({self.pool.get_stats().get('requests_waiting', 0)} waiting)"
+            )
+            raise PoolExhausted(timeout or self.acquire_timeout)
+        self.wait_latency.observe(time.perf_counter() - started)
+        return conn
 
     def release_conn(self, conn):
         self.pool.putconn(conn)
@@ -19,12 +63,112 @@ class DatabaseManager:
     def close_all(self):
         self.pool.close()
 
+    def init_app(self, app):
+        app.teardown_appcontext(self.teardown_request_connection)
+
     @contextmanager
     def connection(self):
+        # inside an app context every block shares the request connection,
+        # elsewhere (startup, seeding, background tasks) it is a plain checkout
+        if has_app_context():
+            with self.request_connection() as conn:
+                yield conn
+            return
+
         conn = None
         try:
             conn = self.get_conn()
+            acquired = time.perf_counter()
             yield conn
         finally:
             if conn is not None:
                 self.release_conn(conn)
+                self._record_hold(time.perf_counter() - acquired)
+
+    @contextmanager
+    def request_connection(self):
+        # checked out on first use, released by release_request_connection
+        # or at the latest by teardown_request_connection.
+        # Leaving the outermost block rolls back anything left uncommitted,
+        # so the next block (user loader, view, ...) starts clean.
+        if "db_conn" not in g:
+            g.db_conn_holder = self._holder()
+            g.db_conn = self.get_conn()
+            g.db_conn_acquired = time.perf_counter()
+            g.db_conn_depth = 0
+        conn = g.db_conn
+        g.db_conn_depth += 1
+        try:
+            yield conn
+        finally:
+            g.db_conn_depth -= 1
+            if g.db_conn_depth == 0:
+                self._reset(conn)
+
+    def release_request_connection(self):
+        # hands the request connection back before slow non-DB work (bcrypt,
+        # rendering, outbound calls); the next connection() checks out anew
+        if g.get("db_conn_depth"):
+            raise RuntimeError("request connection released inside a connection() block")
+        self.teardown_request_connection()
+
+    def teardown_request_connection(self, exc=None):
+        conn = g.pop("db_conn", None)
+        if conn is None:
+            return
+        self._reset(conn)
+        self.release_conn(conn)
+        self._record_hold(
+            time.perf_counter() - g.pop("db_conn_acquired"), g.pop("db_conn_holder")
+        )
+
+    @staticmethod
+    def _reset(conn):
+        if conn.closed:
+            return
+        if conn.info.transaction_status != pq.TransactionStatus.IDLE:
+            conn.rollback()
+        if conn.autocommit:
+            conn.autocommit = False
+
+    @staticmethod
+    def _holder():
+        # the view holding the connection, or "background" outside requests
+        if has_request_context():
+            return request.endpoint or request.path
+        return "background"
+
+    def _record_hold(self, seconds, holder=None):
+        self.hold_latency.observe(seconds)
+        hold_ms = seconds * 1000
+        if hold_ms < self.slow_hold_ms:
+            return
+        holder = holder or self._holder()
+        logger.warning(f"DB POOL : {holder} held a connection for {hold_ms:.0f}ms")
+        entry = (round(hold_ms, 1), time.time(), holder)
+        with self._lock:
+            if len(self._slow_holders) < SLOW_HOLDERS_KEPT:
+                heapq.heappush(self._slow_holders, entry)
+            else:
+                heapq.heappushpop(self._slow_holders, entry)
+
+    def stats(self):
+        pool_stats = self.pool.get_stats()
+        size = pool_stats.get("pool_size", 0)
+        idle = pool_stats.get("pool_available", 0)
+        with self._lock:
+            slowest = sorted(self._slow_holders, reverse=True)
+            timeouts = self.timeouts
+        return {
+            "max_size": self.pool.max_size,
+            "in_use": size - idle,
+            "idle": idle,
+            "waiting": pool_stats.get("requests_waiting", 0),
+            "timeouts": timeouts,
+            "wait": self.wait_latency.snapshot(),
+            "hold": self.hold_latency.snapshot(),
+            "slowest_holders": [
+                {"hold_ms": hold_ms, "at": at, "holder": holder}
+                for hold_ms, at, holder in slowest
+            ],
+        }
@@ -1,4 +1,7 @@
 from psycopg.rows import dict_row
+from app.db_store.crud_utilities import fetch_pipelined
+
+VEHICLE_SELECT = "SELECT v.id, v.driver_id, v.model, v.registration_date, v.plate_number, v.color, v.number_of_seats, b.name AS brand, e.name AS energy_type FROM vehicles v JOIN vehicle_brand b ON v.brand = b.id JOIN energy_types e ON v.energy_type = e.id"
 
 
 def get_driver_data(conn, user_id):
@@ -12,6 +15,66 @@ def get_driver_data(conn, user_id):
         return driver_data if driver_data else None
 
 
+def get_driver_info(conn, user_id):
+    # driver row, preferences and vehicles in a single round-trip
+    data, preferences, vehicles = fetch_pipelined(
+        conn,
+        [
+            ("SELECT id, rating FROM driver_data WHERE user_id = %s", (user_id,)),
+            (
+                "SELECT p.name FROM preferences p JOIN driver_preferences dp ON dp.preference_id = p.id JOIN driver_data d ON d.id = dp.driver_id WHERE d.user_id = %s",
+                (user_id,),
+            ),
+            (
+                f"{VEHICLE_SELECT} JOIN driver_data d ON d.id = v.driver_id WHERE d.user_id = %s",
+                (user_id,),
+            ),
+        ],
+    )
+    if not data:
+        return {}
+    return {
+        "data": data[0],
+        "preferences": preferences or None,
+        "vehicles": vehicles or None,
+    }
+
+
+def get_driver_version(conn, user_id):
+    # driver_data.version, bumped by rating / preference / vehicle changes
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM driver_data WHERE user_id = %s", (user_id,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def get_preferences_form(conn, user_id):
+    # (driver's current preferences, every preference) in a single round-trip
+    selected, all_prefs = fetch_pipelined(
+        conn,
+        [
+            (
+                "SELECT p.name FROM preferences p JOIN driver_preferences dp ON dp.preference_id = p.id JOIN driver_data d ON d.id = dp.driver_id WHERE d.user_id = %s",
+                (user_id,),
+            ),
+            ("SELECT id, name FROM preferences ORDER BY name", None),
+        ],
+    )
+    return selected or None, all_prefs or None
+
+
+def get_vehicle_form_options(conn):
+    # (brands, energy types) in a single round-trip
+    brands, energy_types = fetch_pipelined(
+        conn,
+        [
+            ("SELECT id, name FROM vehicle_brand ORDER BY name", None),
+            ("SELECT id, name FROM energy_types ORDER BY name", None),
+        ],
+    )
+    return brands or None, energy_types or None
+
+
 def create_driver(conn, user_id):
     with conn.cursor() as cur:
         cur.execute(
@@ -22,15 +85,26 @@ def create_driver(conn, user_id):
 
 
 def set_driver_preferences(conn, driver_id, preferences):
-    with conn.cursor() as cur:
-        cur.execute("DELETE FROM driver_preferences WHERE driver_id = %s", (driver_id,))
-        for preference in preferences:
-            cur.execute(
-                "INSERT INTO driver_preferences (driver_id, preference_id) VALUES (%s, %s)",
-                (driver_id, preference),
+    # diff against the desired set : only removed preferences are deleted,
+    # only new ones inserted. Returns the resulting preferences.
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(
+            """
+            WITH removed AS (
+                DELETE FROM driver_preferences
+                WHERE driver_id = %(driver_id)s AND preference_id <> ALL(%(pref_ids)s::uuid[])
+            ), added AS (
+                INSERT INTO driver_preferences (driver_id, preference_id)
+                SELECT %(driver_id)s, pref_id FROM unnest(%(pref_ids)s::uuid[]) AS pref_id
+                ON CONFLICT DO NOTHING
             )
+            SELECT name FROM preferences WHERE id = ANY(%(pref_ids)s::uuid[]) ORDER BY name
+            """,
+            {"driver_id": driver_id, "pref_ids": list(preferences)},
+        )
+        current_preferences = cur.fetchall()
         conn.commit()
-        return True
+        return current_preferences if current_preferences else None
 
 
 def get_driver_preferences(conn, driver_id):
@@ -85,7 +159,7 @@ def get_driver_vehicles(conn, driver_id):
     conn.autocommit = True
     with conn.cursor(row_factory=dict_row) as cur:
         cur.execute(
-            "SELECT v.id, v.model, v.registration_date, v.plate_number, v.color, v.number_of_seats, b.name AS brand, e.name AS energy_type FROM vehicles v JOIN vehicle_brand b ON v.brand = b.id JOIN energy_types e ON v.energy_type_id = e.id WHERE v.driver_id = %s",
+            f"{VEHICLE_SELECT} WHERE v.driver_id = %s",
             (driver_id,),
         )
         vehicles = cur.fetchall()
@@ -96,7 +170,7 @@ def get_vehicle_by_id(conn, vehicle_id):
     conn.autocommit = True
     with conn.cursor(row_factory=dict_row) as cur:
         cur.execute(
-            "SELECT v.id, v.driver_id, v.registration_date, v.plate_number, v.color, v.number_of_seats, b.name AS brand, e.name AS energy_type FROM vehicles v JOIN vehicle_brand b ON v.brand = b.id JOIN energy_types e ON v.energy_type_id = e.id WHERE v.id = %s",
+            f"{VEHICLE_SELECT} WHERE v.id = %s",
             (vehicle_id,),
         )
         vehicle = cur.fetchone()
@@ -104,22 +178,23 @@ def get_vehicle_by_id(conn, vehicle_id):
 
 
 def set_driver_rating(conn, driver_id):
+    # ratings are maintained by triggers (driver_rating_stats), this only
+    # rebuilds one driver's aggregate from scratch and returns the new rating
     with conn.cursor() as cur:
-        cur.execute(
-            "SELECT rating FROM trips WHERE driver_id = %s AND rating > 0", (driver_id,)
-        )
-        all_ratings = cur.fetchall()
+        cur.execute("SELECT driver_rating_resync(%s)", (driver_id,))
+        rating = cur.fetchone()[0]
+        conn.commit()
+        return rating
 
-        if not all_ratings:
-            average = 0
-        else:
-            average = sum(int(x[0]) for x in all_ratings) / len(all_ratings)
 
+def get_driver_rating_stats(conn, driver_id):
+    with conn.cursor(row_factory=dict_row) as cur:
         cur.execute(
-            "UPDATE driver_data SET rating = %s WHERE user_id = %s",
-            (average, driver_id),
+            "SELECT rating_sum, rating_count, histogram FROM driver_rating_stats WHERE driver_id = %s",
+            (driver_id,),
         )
-        conn.commit()
+        stats = cur.fetchone()
+        return stats if stats else None
 
 
 def get_vehicle_brands(conn):
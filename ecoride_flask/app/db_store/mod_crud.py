@@ -0,0 +1,187 @@
+# review moderation queue : pending reviews are read, claimed and decided
+# through the reviews_pending_idx partial index (see db_init.sql)
+import logging
+from psycopg.rows import dict_row
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+QUEUE_PAGE_SIZE = 50
+QUEUE_MAX_PAGE_SIZE = 200
+CLAIM_SIZE = 20
+CLAIM_LEASE_SECONDS = 600
+
+REVIEW_SELECT = """
+    SELECT
+        r.id,
+        r.trip_id,
+        r.rating,
+        r.comments,
+        r.created_at,
+        r.claimed_by,
+        r.claim_expires_at,
+        u.username AS author,
+        ts.start_city,
+        ts.end_city,
+        ts.start_time
+    FROM reviews r
+    JOIN users u ON u.id = r.author_id
+    LEFT JOIN trip_search ts ON ts.trip_id = r.trip_id
+"""
+
+
+def get_pending_reviews(conn, pending_id, after=None, limit=QUEUE_PAGE_SIZE):
+    # keyset pagination on (created_at, review id), like the trip search :
+    # returns (reviews, next_after), next_after is None on the last page.
+    limit = max(1, min(int(limit), QUEUE_MAX_PAGE_SIZE))
+    query = REVIEW_SELECT + " WHERE r.review_status_id = %s"
+    params = [pending_id]
+
+    if after:
+        query += " AND (r.created_at, r.id) > (%s, %s)"
+        params.extend(after)
+
+    query += " ORDER BY r.created_at ASC, r.id ASC LIMIT %s"
+    params.append(limit + 1)
+
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(query, params)
+        reviews = cur.fetchall()
+    conn.commit()
+
+    next_after = None
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        last = reviews[-1]
+        next_after = (last["created_at"], last["id"])
+
+    return reviews, next_after
+
+
+def count_pending_reviews(conn, pending_id):
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT COUNT(*) FROM reviews WHERE review_status_id = %s", (pending_id,)
+        )
+        count = cur.fetchone()[0]
+    conn.commit()
+    return count
+
+
+def claim_reviews(
+    conn, pending_id, moderator_id, count=CLAIM_SIZE, lease=CLAIM_LEASE_SECONDS
+):
+    # takes the oldest pending reviews nobody holds a live lease on. Rows being
+    # claimed by another moderator right now are skipped rather than waited
+    # for, so parallel claims never hand out the same review. The moderator's
+    # own claims count towards `count` and get their lease renewed.
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                WITH picked AS (
+                    SELECT id FROM reviews
+                    WHERE review_status_id = %(pending)s
+                      AND (
+                        claimed_by IS NULL
+                        OR claimed_by = %(moderator)s
+                        OR claim_expires_at < now()
+                      )
+                    ORDER BY created_at ASC, id ASC
+                    LIMIT %(count)s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE reviews r SET
+                    claimed_by = %(moderator)s,
+                    claim_expires_at = now() + make_interval(secs => %(lease)s)
+                FROM picked
+                WHERE r.id = picked.id
+                """,
+                {
+                    "pending": pending_id,
+                    "moderator": moderator_id,
+                    "count": count,
+                    "lease": lease,
+                },
+            )
+            claimed = cur.rowcount
+        conn.commit()
+        logger.info(f"Moderator {moderator_id} claimed {claimed} reviews")
+        return claimed
+
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error claiming reviews for {moderator_id}: {e}")
+        raise
+
+
+def get_claimed_reviews(conn, pending_id, moderator_id):
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(
+            REVIEW_SELECT
+            + """
+            WHERE r.claimed_by = %s
+              AND r.review_status_id = %s
+              AND r.claim_expires_at > now()
+            ORDER BY r.created_at ASC, r.id ASC
+            """,
+            (moderator_id, pending_id),
+        )
+        reviews = cur.fetchall()
+    conn.commit()
+    return reviews
+
+
+def moderate_reviews(conn, pending_id, moderator_id, review_ids, status_id):
+    # approves / rejects a batch in one statement, the driver rating triggers
+    # then apply the whole batch at once. Only reviews still under this
+    # moderator's live lease are decided; returns the ids actually updated.
+    if not review_ids:
+        return []
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE reviews SET
+                    review_status_id = %(status)s,
+                    claimed_by = NULL,
+                    claim_expires_at = NULL
+                WHERE id = ANY(%(ids)s::uuid[])
+                  AND review_status_id = %(pending)s
+                  AND claimed_by = %(moderator)s
+                  AND claim_expires_at > now()
+                RETURNING id
+                """,
+                {
+                    "status": status_id,
+                    "ids": [str(review_id) for review_id in review_ids],
+                    "pending": pending_id,
+                    "moderator": moderator_id,
+                },
+            )
+            decided = [row[0] for row in cur.fetchall()]
+        conn.commit()
+        logger.info(
+            f"Moderator {moderator_id} set {len(decided)}/{len(review_ids)} reviews to {status_id}"
+        )
+        return decided
+
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error moderating reviews for {moderator_id}: {e}")
+        raise
+
+
+def release_claims(conn, pending_id, moderator_id):
+    # hands the moderator's undecided reviews back to the queue
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE reviews SET claimed_by = NULL, claim_expires_at = NULL
+            WHERE claimed_by = %s AND review_status_id = %s
+            """,
+            (moderator_id, pending_id),
+        )
+        released = cur.rowcount
+    conn.commit()
+    return released
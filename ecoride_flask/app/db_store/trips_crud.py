@@ -1,31 +1,32 @@
 from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
 from datetime import datetime
+from uuid import UUID
+import hashlib
 import json
-from geopy.distance import geodesic
+import logging
+import time
+from app.geo import distances_and_durations, get_commune_index
+from app.db_store import credits_crud
+from app.utils.search_cache import search_cache
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+# searches starting within the same bucket share a cached result
+SEARCH_DATE_BUCKET_SECONDS = 300
+
+SUMMARY_BATCH_SIZE = 1000
+# bump when the summary layout or its computation changes : older rows are
+# rebuilt by regenerate_all_missing_summaries
+SUMMARY_VERSION = 2
 
 
 def reverse_lookup_coords(lat, lng):
-    villes = {
-        "Paris": {"lat": 48.85341, "lng": 2.34880},
-        "Marseille": {"lat": 43.29695, "lng": 5.38107},
-        "Lyon": {"lat": 45.74846, "lng": 4.84671},
-        "Toulouse": {"lat": 43.60426, "lng": 1.44367},
-        "Nice": {"lat": 43.70313, "lng": 7.26608},
-        "Nantes": {"lat": 47.21725, "lng": -1.55336},
-        "Strasbourg": {"lat": 48.58392, "lng": 7.74553},
-        "Montpellier": {"lat": 43.61092, "lng": 3.87723},
-        "Bordeaux": {"lat": 44.84044, "lng": -0.58050},
-        "Lille": {"lat": 50.63297, "lng": 3.05858},
-        "Rennes": {"lat": 48.11198, "lng": -1.67429},
-        "Reims": {"lat": 49.25000, "lng": 4.03333},
-        "Le Havre": {"lat": 49.49380, "lng": 0.10767},
-        "Grenoble": {"lat": 45.17155, "lng": 5.72239},
-        "Dijon": {"lat": 47.31667, "lng": 5.01667},
-    }
-    for city, coords in villes.items():
-        if abs(coords["lat"] - lat) < 0.05 and abs(coords["lng"] - lng) < 0.05:
-            return city
-    return "Unknown"
+    city = get_commune_index().nearest(lat, lng)
+    return city if city else "Unknown"
 
 
 def create_tripp(conn, trip_data):
@@ -66,6 +67,7 @@ def update_trip_status(conn, trip_id, new_status):
     with conn.cursor() as cur:
         cur.execute("UPDATE trips SET status = %s WHERE id = %s", (new_status, trip_id))
         conn.commit()
+        search_cache.bump()
         return True
 
 
@@ -84,6 +86,91 @@ def get_trip_available_seats(conn, trip_id):
         return available_seats
 
 
+BOOKABLE_STATUSES = ("pending", "upcoming")
+
+
+def book_trip(conn, trip_id, user_id):
+    # reserves one seat for user_id and posts the payment to the ledger.
+    # The trip's seat counter row is locked, so concurrent bookings queue on
+    # it and each re-reads the latest count : no overselling and no
+    # serialization failures to retry. Only the passenger's balance row is
+    # locked, the driver is paid by an appended ledger entry.
+    # Returns (result, seats_left), result in booked / already_booked / full /
+    # insufficient_credits / own_trip / unavailable.
+    try:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT
+                    s.capacity - s.booked AS seats_left,
+                    t.price,
+                    d.user_id AS driver_user_id,
+                    EXISTS (
+                        SELECT 1 FROM trip_passengers
+                        WHERE trip_id = s.trip_id AND user_id = %(user_id)s
+                    ) AS already
+                FROM trip_seats s
+                JOIN trips t ON t.id = s.trip_id
+                JOIN trip_status ts ON ts.id = t.trip_status
+                JOIN driver_data d ON d.id = t.driver_id
+                WHERE s.trip_id = %(trip_id)s AND ts.name = ANY(%(statuses)s)
+                FOR UPDATE OF s
+                """,
+                {
+                    "trip_id": trip_id,
+                    "user_id": user_id,
+                    "statuses": list(BOOKABLE_STATUSES),
+                },
+            )
+            seat = cur.fetchone()
+
+            if seat is None:
+                result = "unavailable", None
+            elif str(seat["driver_user_id"]) == str(user_id):
+                result = "own_trip", seat["seats_left"]
+            elif seat["already"]:
+                result = "already_booked", seat["seats_left"]
+            elif seat["seats_left"] <= 0:
+                result = "full", 0
+            elif (credits_crud.lock_balance(conn, user_id) or 0) < seat["price"]:
+                result = "insufficient_credits", seat["seats_left"]
+            else:
+                # the EXISTS above reads the statement snapshot, blind to a
+                # booking committed by an overlapping request of the same
+                # user while this one waited on the seat lock : the
+                # conflict clause is what makes double-clicks safe
+                cur.execute(
+                    """
+                    INSERT INTO trip_passengers (trip_id, user_id) VALUES (%s, %s)
+                    ON CONFLICT (trip_id, user_id) DO NOTHING
+                    RETURNING booking_id
+                    """,
+                    (trip_id, user_id),
+                )
+                booking = cur.fetchone()
+                if booking is None:
+                    conn.rollback()
+                    return "already_booked", seat["seats_left"]
+                key = f"booking:{booking['booking_id']}"
+                credits_crud.post_entries(
+                    conn,
+                    [
+                        (user_id, -seat["price"], "booking_debit", trip_id, f"{key}:debit"),
+                        (seat["driver_user_id"], seat["price"], "booking_credit", trip_id, f"{key}:credit"),
+                    ],
+                    commit=False,
+                )
+                conn.commit()
+                search_cache.bump()
+                return "booked", seat["seats_left"] - 1
+
+        conn.rollback()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+
+
 def get_passenger_trips(conn, user_id, status=None):
     with conn.cursor(row_factory=dict_row) as cur:
         query = """
@@ -137,21 +224,27 @@ def search_summaries_asst(
     passenger_nr=None,
     start_date=None,
     max_price=None,
+    after=None,
+    limit=SEARCH_PAGE_SIZE,
 ):
+    # keyset pagination on (start_time, trip_id) : `after` is the last row
+    # of the previous page, so every page is one index range scan.
+    # returns (trips, next_after), next_after is None on the last page.
     conn.autocommit = True
+    limit = max(1, min(int(limit), SEARCH_MAX_PAGE_SIZE))
     query = """
-        SELECT *
-        FROM trip_summaries_asst
+        SELECT trip_id, driver_id, status, start_time, summary, available_seats, version
+        FROM trip_search
         WHERE status IN ('pending', 'upcoming')
     """
     params = []
 
     if start_city:
-        query += " AND summary->>'start_city' = %s"
+        query += " AND start_city = %s"
         params.append(start_city)
 
     if end_city:
-        query += " AND summary->>'end_city' = %s"
+        query += " AND end_city = %s"
         params.append(end_city)
 
     if passenger_nr:
@@ -159,20 +252,78 @@ def search_summaries_asst(
         params.append(int(passenger_nr))
 
     if start_date and start_date.lower() != "none":
-        query += " AND (summary->>'start_time')::timestamp >= %s"
+        query += " AND start_time >= %s"
         params.append(start_date)
 
     if max_price:
-        query += " AND (summary->>'price')::int <= %s"
-        params.append(max_price)
+        query += " AND price <= %s"
+        params.append(int(max_price))
+
+    if after:
+        query += " AND (start_time, trip_id) > (%s, %s)"
+        params.extend(after)
 
-    query += " ORDER BY (summary->>'start_time')::timestamp ASC"
+    query += " ORDER BY start_time ASC, trip_id ASC LIMIT %s"
+    params.append(limit + 1)
 
     with conn.cursor(row_factory=dict_row) as cur:
         cur.execute(query, params)
         trips = cur.fetchall()
 
-    return trips if trips else None
+    next_after = None
+    if len(trips) > limit:
+        trips = trips[:limit]
+        last = trips[-1]
+        next_after = (last["start_time"], last["trip_id"])
+
+    return (trips if trips else None), next_after
+
+
+def search_date_bucket(start_date, bucket=SEARCH_DATE_BUCKET_SECONDS):
+    # floors the start date to the bucket, so "now" searches made within a
+    # few minutes share a key. Floored, not rounded up : a trip leaving in
+    # the next minutes is never hidden, one that just left may still show.
+    if not start_date or str(start_date).lower() == "none":
+        return None
+    try:
+        start = datetime.fromisoformat(str(start_date))
+    except ValueError:
+        return start_date
+    floored = start.timestamp() // bucket * bucket
+    return datetime.fromtimestamp(floored, start.tzinfo).isoformat()
+
+
+def cached_search_summaries(
+    db_manager,
+    start_city=None,
+    end_city=None,
+    passenger_nr=None,
+    start_date=None,
+    max_price=None,
+    after=None,
+):
+    # search_summaries_asst behind the search cache : a hit returns without
+    # checking out a connection
+    start_city = (start_city or "").strip() or None
+    end_city = (end_city or "").strip() or None
+    passenger_nr = int(passenger_nr) if passenger_nr else None
+    max_price = int(max_price) if max_price else None
+    start_date = search_date_bucket(start_date)
+
+    def load():
+        with db_manager.connection() as conn:
+            return search_summaries_asst(
+                conn,
+                start_city=start_city,
+                end_city=end_city,
+                passenger_nr=passenger_nr,
+                start_date=start_date,
+                max_price=max_price,
+                after=after,
+            )
+
+    key = (start_city, end_city, passenger_nr, start_date, max_price, after)
+    return search_cache.get_or_load(key, load)
 
 
 def get_trip_summary(conn, trip_id):
@@ -189,46 +340,75 @@ def get_trip_summary(conn, trip_id):
         return trip_summary if trip_summary else None
 
 
-def generate_trip_summary(conn, trip_id, commit=True):
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT
-                t.id,
-                ST_Y(t.start_location::geometry),
-                ST_X(t.start_location::geometry),
-                ST_Y(t.end_location::geometry),
-                ST_X(t.end_location::geometry),
-                t.start_time,
-                t.price,
-                d.rating,
-                v.plate_number,
-                v.model,
-                v.color,
-                b.name AS brand,
-                e.name AS energy,
-                u.username AS driver_name
-            FROM trips t
-            JOIN driver_data d ON t.driver_id = d.id
-            JOIN users u ON d.user_id = u.id
-            JOIN vehicles v ON t.vehicle_id = v.id
-            JOIN vehicle_brand b ON v.brand = b.id
-            JOIN energy_types e ON v.energy_type = e.id
-            WHERE t.id = %s
-        """,
-            (trip_id,),
-        )
-
-        row = cur.fetchone()
-        if not row:
-            raise ValueError(f"No trip found with ID: {trip_id}")
-
+# everything a summary is built from, one row per trip
+TRIP_SUMMARY_SOURCE = """
+    SELECT
+        t.id,
+        ST_Y(t.start_location::geometry),
+        ST_X(t.start_location::geometry),
+        ST_Y(t.end_location::geometry),
+        ST_X(t.end_location::geometry),
+        t.start_time,
+        t.price,
+        d.rating,
+        v.plate_number,
+        v.model,
+        v.color,
+        b.name AS brand,
+        e.name AS energy,
+        u.username AS driver_name
+    FROM trips t
+    JOIN driver_data d ON t.driver_id = d.id
+    JOIN users u ON d.user_id = u.id
+    JOIN vehicles v ON t.vehicle_id = v.id
+    JOIN vehicle_brand b ON v.brand = b.id
+    JOIN energy_types e ON v.energy_type = e.id
+"""
+
+
+def trip_speed(trip_id):
+    # 60-89 km/h, stable for a given trip in every process and every run
+    # (the builtin hash() is salted per process for strings)
+    digest = hashlib.blake2b(UUID(str(trip_id)).bytes, digest_size=8).digest()
+    return 60 + int.from_bytes(digest, "big") % 30
+
+
+def summary_hash(summary):
+    # canonical JSON, so equal summaries hash the same whatever the key order
+    canonical = json.dumps(
+        summary, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def build_trip_summaries(rows):
+    # rows from TRIP_SUMMARY_SOURCE -> [(trip_id, summary), ...]
+    # distances, durations and cities are computed for the whole chunk
+    # first, then the per-trip dicts are assembled.
+    if not rows:
+        return []
+
+    start_lat, start_lng, end_lat, end_lng = zip(*(row[1:5] for row in rows))
+    speeds = [trip_speed(row[0]) for row in rows]
+    distances, durations = distances_and_durations(
+        start_lat, start_lng, end_lat, end_lng, speeds
+    )
+    communes = get_commune_index()
+    start_cities = [
+        city or "Unknown" for city in communes.nearest_many(start_lat, start_lng)
+    ]
+    end_cities = [city or "Unknown" for city in communes.nearest_many(end_lat, end_lng)]
+
+    summaries = []
+    for row, distance_km, duration_min, start_city, end_city in zip(
+        rows, distances.tolist(), durations.tolist(), start_cities, end_cities
+    ):
         (
             trip_id,
-            start_lat,
-            start_lng,
-            end_lat,
-            end_lng,
+            _start_lat,
+            _start_lng,
+            _end_lat,
+            _end_lng,
             start_time,
             price,
             rating,
@@ -240,13 +420,6 @@ def generate_trip_summary(conn, trip_id, commit=True):
             driver_name,
         ) = row
 
-        distance_km = geodesic((start_lat, start_lng), (end_lat, end_lng)).kilometers
-        speed = 60 + (hash(trip_id) % 30)
-        duration_min = round((distance_km / speed) * 60)
-
-        start_city = reverse_lookup_coords(start_lat, start_lng)
-        end_city = reverse_lookup_coords(end_lat, end_lng)
-
         summary = {
             "start_city": start_city,
             "end_city": end_city,
@@ -264,28 +437,108 @@ def generate_trip_summary(conn, trip_id, commit=True):
             "driver_name": driver_name,
             "driver_rating": rating,
         }
+        summaries.append((trip_id, summary))
 
-        cur.execute(
-            "INSERT INTO trip_summaries (trip_id, summary) VALUES (%s, %s) ON CONFLICT (trip_id) DO UPDATE SET summary = EXCLUDED.summary",
-            (trip_id, json.dumps(summary)),
-        )
+    return summaries
+
+
+def write_trip_summaries(cur, summaries):
+    # one multi-row upsert for the whole chunk. Rows whose content hash and
+    # version are unchanged are skipped, so rewriting an identical summary
+    # costs no write and fires no search / cache update.
+    # Returns the number of rows actually written.
+    if not summaries:
+        return 0
+    cur.execute(
+        """
+        INSERT INTO trip_summaries AS s (trip_id, summary, summary_version, content_hash)
+        SELECT * FROM unnest(%s::uuid[], %s::jsonb[], %s::smallint[], %s::text[])
+        ON CONFLICT (trip_id) DO UPDATE SET
+            summary = EXCLUDED.summary,
+            summary_version = EXCLUDED.summary_version,
+            content_hash = EXCLUDED.content_hash
+        WHERE s.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+           OR s.summary_version IS DISTINCT FROM EXCLUDED.summary_version
+        """,
+        (
+            [trip_id for trip_id, _ in summaries],
+            [Jsonb(summary) for _, summary in summaries],
+            [SUMMARY_VERSION] * len(summaries),
+            [summary_hash(summary) for _, summary in summaries],
+        ),
+    )
+    return cur.rowcount
+
+
+def generate_trip_summary(conn, trip_id, commit=True):
+    with conn.cursor() as cur:
+        cur.execute(TRIP_SUMMARY_SOURCE + " WHERE t.id = %s", (trip_id,))
+
+        row = cur.fetchone()
+        if not row:
+            raise ValueError(f"No trip found with ID: {trip_id}")
+
+        written = write_trip_summaries(cur, build_trip_summaries([row]))
         if commit:
             conn.commit()
+            if written:
+                search_cache.bump()
+        return written
 
 
-def regenerate_all_missing_summaries(conn):
+def regenerate_all_missing_summaries(conn, batch_size=SUMMARY_BATCH_SIZE):
+    # chunked pipeline : fetch a chunk of trips without a current summary
+    # (missing, or built by an older SUMMARY_VERSION), keyset on id, build
+    # the chunk, upsert it in one statement, commit, repeat.
+    # Returns the number of summaries actually written.
     with conn.cursor() as cur:
-        cur.execute("""
-            SELECT t.id
+        cur.execute(
+            """
+            SELECT COUNT(*)
             FROM trips t
             LEFT JOIN trip_summaries s ON s.trip_id = t.id
-            WHERE s.trip_id IS NULL
-        """)
-        trip_ids = [row[0] for row in cur.fetchall()]
+            WHERE s.trip_id IS NULL OR s.summary_version < %s
+            """,
+            (SUMMARY_VERSION,),
+        )
+        total = cur.fetchone()[0]
+    conn.commit()
+
+    if not total:
+        return 0
+
+    processed = 0
+    written = 0
+    last_id = UUID(int=0)
+    started = time.perf_counter()
+
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(
+                TRIP_SUMMARY_SOURCE
+                + """
+                LEFT JOIN trip_summaries s ON s.trip_id = t.id
+                WHERE (s.trip_id IS NULL OR s.summary_version < %s) AND t.id > %s
+                ORDER BY t.id
+                LIMIT %s
+                """,
+                (SUMMARY_VERSION, last_id, batch_size),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                break
+
+            written += write_trip_summaries(cur, build_trip_summaries(rows))
+        conn.commit()
+        processed += len(rows)
+        last_id = rows[-1][0]
 
-    counter = 0
-    for trip_id in trip_ids:
-        generate_trip_summary(conn, trip_id)
-        counter += 1
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"BATCH SUMMARIES: {processed}/{total}, {written} written "
+            f"({processed / elapsed if elapsed else 0:.0f} trips/s)"
+        )
 
-    return counter
+    if written:
+        search_cache.bump()
+    return written
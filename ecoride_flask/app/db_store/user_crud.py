@@ -2,7 +2,8 @@
 from flask import current_app
 import logging
 from psycopg.rows import dict_row
-from app.models import SessionUser
+from app.models import SessionUser, session_user_cache
+from app.db_store import credits_crud
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +21,52 @@ def create_account(conn, email, hashed_password):
         return account_id
 
 
+def register_account(conn, email, hashed_password, username, role_ids, driver=False):
+    # account + user + roles (+ driver profile) in one statement and one commit.
+    # Raises psycopg.errors.UniqueViolation on a taken email / username.
+    access_id = current_app.static_ids["account_access"]["user"]
+    status_id = current_app.static_ids["account_status"]["active"]
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                WITH account AS (
+                    INSERT INTO accounts (email, password_hash, account_access_id, account_status_id)
+                    VALUES (%(email)s, %(hash)s, %(access_id)s, %(status_id)s)
+                    RETURNING id
+                ), new_user AS (
+                    INSERT INTO users (username, account_id)
+                    SELECT %(username)s, id FROM account
+                    RETURNING id
+                ), roles AS (
+                    INSERT INTO user_roles (user_id, role_id)
+                    SELECT new_user.id, role_id FROM new_user, unnest(%(role_ids)s::uuid[]) AS role_id
+                ), driver AS (
+                    INSERT INTO driver_data (user_id)
+                    SELECT id FROM new_user WHERE %(driver)s
+                    RETURNING id
+                )
+                SELECT account.id, new_user.id, (SELECT id FROM driver)
+                FROM account, new_user
+                """,
+                {
+                    "email": email,
+                    "hash": hashed_password,
+                    "access_id": access_id,
+                    "status_id": status_id,
+                    "username": username,
+                    "role_ids": list(role_ids),
+                    "driver": driver,
+                },
+            )
+            account_id, user_id, driver_id = cur.fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return account_id, user_id, driver_id
+
+
 def get_user_by_account_id(conn, account_id):
     conn.autocommit = True
     with conn.cursor() as cur:
@@ -63,6 +110,16 @@ def retrieve_password(conn, account_id):
         return None
 
 
+def update_password_hash(conn, account_id, hashed_password):
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE accounts SET password_hash = %s WHERE id = %s",
+            (hashed_password, account_id),
+        )
+        conn.commit()
+    return True
+
+
 def check_username(conn, username):
     conn.autocommit = True
     with conn.cursor() as cur:
@@ -77,9 +134,23 @@ def set_username(conn, user_id, username):
     with conn.cursor() as cur:
         cur.execute("UPDATE users SET username = %s WHERE id = %s", (username, user_id))
         conn.commit()
+    session_user_cache.invalidate(user_id=user_id)
     return True
 
 
+def set_account_status(conn, account_id, status_id):
+    # the accounts trigger broadcasts the change to every process's cache
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE accounts SET account_status_id = %s WHERE id = %s",
+            (status_id, account_id),
+        )
+        updated = cur.rowcount
+        conn.commit()
+    session_user_cache.invalidate(account_id=account_id)
+    return updated > 0
+
+
 def get_user_by_email(conn, email):
     conn.autocommit = True
     with conn.cursor() as cur:
@@ -136,24 +207,29 @@ def get_user_roles(conn, user_id):
 
 
 def set_user_roles(conn, user_id, roles):
+    # diff against the desired set : only removed roles are deleted, only new
+    # ones inserted. Returns the resulting role names.
     with conn.cursor() as cur:
-        cur.execute("DELETE FROM user_roles WHERE user_id = %s", (user_id,))
-        for role in roles:
-            print(f"inserting role : {role}")
-            cur.execute(
-                "INSERT INTO user_roles (user_id, role_id) VALUES (%s, %s)",
-                (user_id, role),
+        cur.execute(
+            """
+            WITH removed AS (
+                DELETE FROM user_roles
+                WHERE user_id = %(user_id)s AND role_id <> ALL(%(role_ids)s::uuid[])
+            ), added AS (
+                INSERT INTO user_roles (user_id, role_id)
+                SELECT %(user_id)s, role_id FROM unnest(%(role_ids)s::uuid[]) AS role_id
+                ON CONFLICT DO NOTHING
             )
+            SELECT name FROM roles WHERE id = ANY(%(role_ids)s::uuid[]) ORDER BY name
+            """,
+            {"user_id": user_id, "role_ids": list(roles)},
+        )
+        roles = [row[0] for row in cur.fetchall()]
         conn.commit()
-        return True
+        session_user_cache.invalidate(user_id=user_id)
+        return roles
 
 
 def get_user_credits(conn, user_id):
-    conn.autocommit = True
-    with conn.cursor() as cur:
-        cur.execute(
-            "SELECT credits FROM users WHERE id = %s",
-            (user_id,),
-        )
-        credits = cur.fetchone()
-        return credits[0] if credits else 0
+    # settled snapshot + unsettled ledger postings
+    return credits_crud.get_balance(conn, user_id)
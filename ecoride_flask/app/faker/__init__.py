@@ -1,2 +1,3 @@
 from .db_seed_faker import seed_data
+from .parallel_seed import seed_data_parallel
 from .villes import villes
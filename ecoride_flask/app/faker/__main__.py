@@ -0,0 +1,47 @@
+# load-test datasets : python -m app.faker --scale 100 --seed 42
+import argparse
+import logging
+from app.db_store import DatabaseManager, trips_crud
+from app.faker import seed_data, seed_data_parallel
+from config import db_config
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+parser = argparse.ArgumentParser(description="Seed the ecoride database.")
+parser.add_argument("--drivers", type=int, default=1000)
+parser.add_argument("--users", type=int, default=3000)
+parser.add_argument("--trips-per-driver", type=int, default=5)
+parser.add_argument("--scale", type=float, default=1.0)
+parser.add_argument("--seed", type=int, default=None)
+parser.add_argument(
+    "--workers", type=int, default=0, help="generator processes (0 = single process)"
+)
+parser.add_argument("--no-summaries", action="store_true")
+args = parser.parse_args()
+
+db_manager = DatabaseManager(db_config)
+try:
+    if args.workers:
+        seed_data_parallel(
+            db_manager,
+            num_drivers=args.drivers,
+            num_users=args.users,
+            trips_per_driver=args.trips_per_driver,
+            seed=args.seed,
+            scale=args.scale,
+            workers=args.workers,
+        )
+    with db_manager.connection() as conn:
+        if not args.workers:
+            seed_data(
+                conn,
+                num_drivers=args.drivers,
+                num_users=args.users,
+                trips_per_driver=args.trips_per_driver,
+                seed=args.seed,
+                scale=args.scale,
+            )
+        if not args.no_summaries:
+            trips_crud.regenerate_all_missing_summaries(conn)
+finally:
+    db_manager.close_all()
@@ -1,7 +1,9 @@
 from psycopg import sql
 from faker import Faker
-from uuid import uuid4
+from uuid import UUID
+from datetime import datetime, timedelta
 import random
+import time
 from app.faker.villes import villes
 import logging
 
@@ -21,9 +23,55 @@ car_models = [
     ("fourgon", 3),  # van
 ]
 
+# COPY order matters : every table only references the ones before it
+SEED_TABLES = [
+    (
+        "accounts",
+        ("id", "email", "password_hash", "account_access_id", "account_status_id"),
+    ),
+    ("users", ("id", "account_id", "username")),
+    ("user_roles", ("user_id", "role_id")),
+    ("driver_data", ("id", "user_id", "rating")),
+    (
+        "vehicles",
+        (
+            "id",
+            "driver_id",
+            "plate_number",
+            "registration_date",
+            "brand",
+            "model",
+            "color",
+            "number_of_seats",
+            "energy_type",
+        ),
+    ),
+    (
+        "trips",
+        (
+            "id",
+            "driver_id",
+            "vehicle_id",
+            "start_location",
+            "end_location",
+            "start_time",
+            "price",
+            "trip_status",
+        ),
+    ),
+    ("trip_passengers", ("trip_id", "user_id")),
+    (
+        "reviews",
+        ("id", "trip_id", "author_id", "rating", "comments", "review_status_id"),
+    ),
+]
+
+# faker text is slow, comments and colors are drawn from small pools
+TEXT_POOL_SIZE = 500
+
 
-def random_ville():
-    city = random.choice(list(villes.keys()))
+def random_ville(rng=random):
+    city = rng.choice(list(villes.keys()))
     coords = villes[city]
     return {
         "label": city,
@@ -32,210 +80,259 @@ def random_ville():
     }
 
 
-def is_value_unique(cur, table, column, value):
-    query = sql.SQL("SELECT 1 FROM {table} WHERE {column} = %s LIMIT 1").format(
-        table=sql.Identifier(table),
-        column=sql.Identifier(column),
+def get_id(cur, table, name):
+    query = sql.SQL("SELECT id FROM {table} WHERE name = %s").format(
+        table=sql.Identifier(table)
     )
-    cur.execute(query, (value,))
-    return cur.fetchone() is None
+    cur.execute(query, (name,))
+    row = cur.fetchone()
+    if not row:
+        raise ValueError(f"No ID found for name '{name}' in table '{table}'")
+    return row[0]
 
 
-def get_unique_email(cur, max_attempts=20):
-    for _ in range(max_attempts):
-        email = fake.email()
-        if is_value_unique(cur, "accounts", "email", email):
-            return email
-    raise ValueError("Unable to generate unique email")
+def load_seed_static(cur):
+    # every reference id the generators need, fetched once
+    cur.execute("SELECT id FROM trip_status")
+    trip_status_ids = [row[0] for row in cur.fetchall()]
+    cur.execute("SELECT id FROM vehicle_brand")
+    brand_ids = [row[0] for row in cur.fetchall()]
+    cur.execute("SELECT id FROM energy_types")
+    energy_ids = [row[0] for row in cur.fetchall()]
+    return {
+        "access_id": get_id(cur, "account_access", "user"),
+        "status_id": get_id(cur, "account_status", "active"),
+        "driver_role_id": get_id(cur, "roles", "driver"),
+        "passenger_role_id": get_id(cur, "roles", "passenger"),
+        "review_approved_id": get_id(cur, "review_status", "approved"),
+        "trip_status_ids": trip_status_ids,
+        "brand_ids": brand_ids,
+        "energy_ids": energy_ids,
+    }
 
 
-def get_unique_username(cur, max_attempts=20):
-    for _ in range(max_attempts):
-        username = fake.user_name()
-        if is_value_unique(cur, "users", "username", username):
-            return username
-    raise ValueError("Unable to generate unique username")
+def load_taken_values(cur):
+    # values already in the DB, so deduplication never needs a round-trip
+    cur.execute("SELECT email FROM accounts")
+    emails = {row[0] for row in cur.fetchall()}
+    cur.execute("SELECT username FROM users")
+    usernames = {row[0] for row in cur.fetchall()}
+    cur.execute("SELECT plate_number FROM vehicles")
+    plates = {row[0] for row in cur.fetchall()}
+    return {"emails": emails, "usernames": usernames, "plates": plates}
 
 
-def get_unique_license_plate(cur, max_attempts=20):
-    for _ in range(max_attempts):
-        plate = fake.license_plate()
-        if is_value_unique(cur, "vehicles", "plate_number", plate):
-            return plate
-    raise ValueError("Unable to generate unique license plate")
+def new_uuid(rng):
+    return UUID(int=rng.getrandbits(128), version=4)
 
 
-def get_id(cur, table, name):
-    query = sql.SQL("SELECT id FROM {table} WHERE name = %s").format(
-        table=sql.Identifier(table)
+def ewkt_point(lat, lng):
+    return f"SRID=4326;POINT({lng} {lat})"
+
+
+# STAGE 1 : generate rows in memory
+
+
+def generate_people(fake, rng, static, count, role_id, user_ids=None):
+    # accounts + users + one role each, emails / usernames not yet unique.
+    # `user_ids` lets the caller fix the user ids (parallel shards).
+    people = {"accounts": [], "users": [], "user_roles": [], "user_ids": []}
+    for i in range(count):
+        account_id = new_uuid(rng)
+        user_id = user_ids[i] if user_ids is not None else new_uuid(rng)
+        people["accounts"].append(
+            [
+                account_id,
+                fake.email(),
+                "fakehash",
+                static["access_id"],
+                static["status_id"],
+            ]
+        )
+        people["users"].append([user_id, account_id, fake.user_name()])
+        people["user_roles"].append((user_id, role_id))
+        people["user_ids"].append(user_id)
+    return people
+
+
+def generate_fleet(fake, rng, static, driver_user_ids, trips_per_driver, now=None):
+    # driver_data + one vehicle per driver + their trips, plates not yet unique
+    now = now or datetime.now()
+    colors = [fake.color_name() for _ in range(TEXT_POOL_SIZE)]
+    fleet = {"driver_data": [], "vehicles": [], "trips": [], "seats": []}
+    for user_id in driver_user_ids:
+        driver_id = new_uuid(rng)
+        fleet["driver_data"].append((driver_id, user_id, rng.randint(3, 5)))
+
+        vehicle_id = new_uuid(rng)
+        model, max_seats = rng.choice(car_models)
+        fleet["vehicles"].append(
+            [
+                vehicle_id,
+                driver_id,
+                fake.license_plate(),
+                (now - timedelta(days=rng.randint(365, 3 * 365))).date(),
+                rng.choice(static["brand_ids"]),
+                model,
+                rng.choice(colors),
+                max_seats,
+                rng.choice(static["energy_ids"]),
+            ]
+        )
+
+        for _ in range(trips_per_driver):
+            start = random_ville(rng)
+            end = random_ville(rng)
+            trip_id = new_uuid(rng)
+            fleet["trips"].append(
+                (
+                    trip_id,
+                    driver_id,
+                    vehicle_id,
+                    ewkt_point(start["lat"], start["lng"]),
+                    ewkt_point(end["lat"], end["lng"]),
+                    now + timedelta(seconds=rng.uniform(86400, 30 * 86400)),
+                    rng.randint(5, 30),
+                    rng.choice(static["trip_status_ids"]),
+                )
+            )
+            fleet["seats"].append((trip_id, max_seats))
+    return fleet
+
+
+def generate_bookings(fake, rng, static, trip_seats, passenger_ids):
+    # passengers picked for every trip, and one review per passenger
+    comments = [fake.sentence() for _ in range(TEXT_POOL_SIZE)]
+    bookings = {"trip_passengers": [], "reviews": []}
+    for trip_id, max_seats in trip_seats:
+        num_passengers = rng.randint(1, min(3, max_seats, len(passenger_ids)))
+        for pid in rng.sample(passenger_ids, num_passengers):
+            bookings["trip_passengers"].append((trip_id, pid))
+            bookings["reviews"].append(
+                (
+                    new_uuid(rng),
+                    trip_id,
+                    pid,
+                    rng.randint(3, 5),
+                    rng.choice(comments),
+                    static["review_approved_id"],
+                )
+            )
+    return bookings
+
+
+# STAGE 2 : deduplicate in Python
+
+
+def dedupe(rows, index, taken, variant, max_length):
+    # rewrites row[index] until it is unique against `taken` (updated in place)
+    for row in rows:
+        value = row[index]
+        attempt = 0
+        while value in taken or len(value) > max_length:
+            attempt += 1
+            value = variant(row[index], attempt)
+        taken.add(value)
+        row[index] = value
+    return rows
+
+
+def email_variant(email, attempt):
+    local, _, domain = email.partition("@")
+    return f"{local}.{attempt}@{domain}"
+
+
+def username_variant(username, attempt):
+    suffix = str(attempt)
+    return username[: 30 - len(suffix)] + suffix
+
+
+def plate_variant(plate, attempt):
+    return fake.license_plate()
+
+
+def dedupe_people(people, taken):
+    dedupe(people["accounts"], 1, taken["emails"], email_variant, 100)
+    dedupe(people["users"], 2, taken["usernames"], username_variant, 30)
+    return people
+
+
+def dedupe_fleet(fleet, taken):
+    dedupe(fleet["vehicles"], 2, taken["plates"], plate_variant, 20)
+    return fleet
+
+
+# STAGE 3 : stream every table through COPY
+
+
+def copy_rows(cur, table, columns, rows):
+    query = sql.SQL("COPY {table} ({columns}) FROM STDIN").format(
+        table=sql.Identifier(table),
+        columns=sql.SQL(", ").join(sql.Identifier(c) for c in columns),
     )
-    cur.execute(query, (name,))
-    row = cur.fetchone()
-    if not row:
-        raise ValueError(f"No ID found for name '{name}' in table '{table}'")
-    return row[0]
+    with cur.copy(query) as copy:
+        for row in rows:
+            copy.write_row(row)
+    return len(rows)
+
+
+def copy_seed_rows(cur, rows):
+    for table, columns in SEED_TABLES:
+        if rows.get(table):
+            started = time.perf_counter()
+            count = copy_rows(cur, table, columns, rows[table])
+            logger.info(
+                f"DB SEED : {table} {count} rows in {time.perf_counter() - started:.2f}s"
+            )
+
+
+def merge_rows(*parts):
+    rows = {}
+    for part in parts:
+        for table, _ in SEED_TABLES:
+            rows.setdefault(table, []).extend(part.get(table, []))
+    return rows
+
 
+def seed_data(
+    conn,
+    num_drivers=1000,
+    num_users=1500,
+    trips_per_driver=5,
+    seed=None,
+    scale=1.0,
+):
+    # `scale` multiplies the user / driver counts, `seed` makes the generated
+    # rows reproducible (dates stay relative to now).
+    num_drivers = max(1, round(num_drivers * scale))
+    num_users = max(1, round(num_users * scale))
+    rng = random.Random(seed)
+    if seed is not None:
+        fake.seed_instance(seed)
 
-def seed_data(conn, num_drivers=1000, num_users=1500, trips_per_driver=5):
     try:
         with conn.cursor() as cur:
-            # Get static IDs
-            access_id = get_id(cur, "account_access", "user")
-            status_id = get_id(cur, "account_status", "active")
-            driver_role_id = get_id(cur, "roles", "driver")
-            passenger_role_id = get_id(cur, "roles", "passenger")
-            cur.execute("SELECT id FROM trip_status")
-            trip_status_ids = [row[0] for row in cur.fetchall()]
-
-            # Create users
-            passenger_ids = []
-            for _ in range(num_users):
-                email = get_unique_email(cur)
-                username = get_unique_username(cur)
-                account_id = str(uuid4())
-                user_id = str(uuid4())
-                cur.execute(
-                    "INSERT INTO accounts (id, email, password_hash, account_access_id, account_status_id) VALUES (%s, %s, %s, %s, %s)",
-                    (account_id, email, "fakehash", access_id, status_id),
-                )
-                cur.execute(
-                    "INSERT INTO users (id, account_id, username) VALUES (%s, %s, %s)",
-                    (user_id, account_id, username),
-                )
-                cur.execute(
-                    "INSERT INTO user_roles (user_id, role_id) VALUES (%s, %s)",
-                    (user_id, passenger_role_id),
-                )
-                passenger_ids.append(user_id)
-
-            # Create drivers and trips
-            for _ in range(num_drivers):
-                account_id = str(uuid4())
-                user_id = str(uuid4())
-                email = get_unique_email(cur)
-                username = get_unique_username(cur)
-                cur.execute(
-                    "INSERT INTO accounts (id, email, password_hash, account_access_id, account_status_id) VALUES (%s, %s, %s, %s, %s)",
-                    (account_id, email, "fakehash", access_id, status_id),
-                )
-                cur.execute(
-                    "INSERT INTO users (id, account_id, username) VALUES (%s, %s, %s)",
-                    (user_id, account_id, username),
-                )
-                cur.execute(
-                    "INSERT INTO user_roles (user_id, role_id) VALUES (%s, %s)",
-                    (user_id, driver_role_id),
-                )
+            static = load_seed_static(cur)
+            taken = load_taken_values(cur)
 
-                driver_id = str(uuid4())
-                cur.execute(
-                    "INSERT INTO driver_data (id, user_id, rating) VALUES (%s, %s, %s)",
-                    (driver_id, user_id, random.randint(3, 5)),
-                )
+            passengers = generate_people(
+                fake, rng, static, num_users, static["passenger_role_id"]
+            )
+            drivers = generate_people(
+                fake, rng, static, num_drivers, static["driver_role_id"]
+            )
+            fleet = generate_fleet(
+                fake, rng, static, drivers["user_ids"], trips_per_driver
+            )
+            bookings = generate_bookings(
+                fake, rng, static, fleet["seats"], passengers["user_ids"]
+            )
 
-                # Get random brand and energy
-                cur.execute("SELECT id FROM vehicle_brand ORDER BY RANDOM() LIMIT 1")
-                brand_id = cur.fetchone()[0]
-                cur.execute("SELECT id FROM energy_types ORDER BY RANDOM() LIMIT 1")
-                energy_id = cur.fetchone()[0]
-                license_plate = get_unique_license_plate(cur)
-                vehicle_id = str(uuid4())
-                model, max_seats = random.choice(car_models)
-                cur.execute(
-                    """
-                    INSERT INTO vehicles (
-                        id, driver_id, plate_number, registration_date, brand, model, color, number_of_seats, energy_type
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-                    (
-                        vehicle_id,
-                        driver_id,
-                        license_plate,
-                        fake.date_between(start_date="-3y", end_date="-1y"),
-                        brand_id,
-                        model,
-                        fake.color_name(),
-                        max_seats,
-                        energy_id,
-                    ),
-                )
+            dedupe_people(passengers, taken)
+            dedupe_people(drivers, taken)
+            dedupe_fleet(fleet, taken)
 
-                # Insert trips for this driver
-                for _ in range(trips_per_driver):
-                    start = random_ville()
-                    end = random_ville()
-                    trip_id = str(uuid4())
-                    start_lat, start_lng = start["lat"], start["lng"]
-                    end_lat, end_lng = end["lat"], end["lng"]
-                    start_time = fake.date_time_between(
-                        start_date="+1d", end_date="+30d"
-                    )
-                    price = random.randint(5, 30)
-                    trip_status = random.choice(trip_status_ids)
-
-                    cur.execute(
-                        """
-                        INSERT INTO trips (
-                            id, driver_id, vehicle_id,
-                            start_location, end_location,
-                            start_time, price, trip_status
-                        ) VALUES (
-                            %s, %s, %s,
-                            ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography,
-                            ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography,
-                            %s, %s, %s
-                        )
-                    """,
-                        (
-                            trip_id,
-                            driver_id,
-                            vehicle_id,
-                            start_lng,
-                            start_lat,
-                            end_lng,
-                            end_lat,
-                            start_time,
-                            price,
-                            trip_status,
-                        ),
-                    )
-
-                    cur.execute(
-                        "SELECT number_of_seats FROM vehicles WHERE id = %s",
-                        (vehicle_id,),
-                    )
-                    max_passengers = cur.fetchone()[0]
-
-                    num_passengers = random.randint(1, min(3, max_passengers))
-                    chosen_passengers = random.sample(passenger_ids, num_passengers)
-
-                    for pid in chosen_passengers:
-                        cur.execute(
-                            "INSERT INTO trip_passengers (trip_id, user_id) VALUES (%s, %s)",
-                            (trip_id, pid),
-                        )
-
-                    # Add reviews
-                    for pid in chosen_passengers:
-                        review_id = str(uuid4())
-                        rating = random.randint(3, 5)
-                        comment = fake.sentence()
-                        review_status_id = get_id(cur, "review_status", "approved")
-                        cur.execute(
-                            """
-                            INSERT INTO reviews (
-                                id, trip_id, author_id, rating, comments, review_status_id
-                            ) VALUES (%s, %s, %s, %s, %s, %s)
-                        """,
-                            (
-                                review_id,
-                                trip_id,
-                                pid,
-                                rating,
-                                comment,
-                                review_status_id,
-                            ),
-                        )
+            copy_seed_rows(cur, merge_rows(passengers, drivers, fleet, bookings))
 
         conn.commit()
     except Exception as e:
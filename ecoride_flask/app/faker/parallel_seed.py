@@ -0,0 +1,240 @@
+import hashlib
+import logging
+import os
+import random
+import time
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from uuid import UUID, uuid4
+from app.faker import db_seed_faker as seeder
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+# drivers per fleet shard / users per people shard
+SHARD_DRIVERS = 5000
+SHARD_USERS = 20000
+
+
+class DerivedIds(Sequence):
+    """User ids computed from (run key, kind, global index).
+
+    Shards never exchange id lists : a fleet shard can pick any passenger
+    of the whole run by index, whichever shard generated that passenger.
+    """
+
+    def __init__(self, run_key, kind, start, count):
+        self.run_key = run_key
+        self.kind = kind
+        self.start = start
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        key = f"{self.run_key}:{self.kind}:{self.start + i}".encode()
+        return UUID(bytes=hashlib.blake2b(key, digest_size=16).digest(), version=4)
+
+
+def split_range(total, shard_size):
+    # [(start, count), ...] covering range(total)
+    return [
+        (start, min(shard_size, total - start))
+        for start in range(0, total, shard_size)
+    ]
+
+
+def _seed_worker(shard_seed):
+    rng = random.Random(shard_seed)
+    seeder.fake.seed_instance(shard_seed)
+    return rng
+
+
+# WORKER PROCESSES : generate one shard each
+
+
+def generate_people_shard(shard_seed, static, run_key, kind, start, count, role_id):
+    rng = _seed_worker(shard_seed)
+    people = seeder.generate_people(
+        seeder.fake,
+        rng,
+        static,
+        count,
+        role_id,
+        user_ids=DerivedIds(run_key, kind, start, count),
+    )
+    del people["user_ids"]
+    return people
+
+
+def generate_fleet_shard(
+    shard_seed, static, run_key, start, count, trips_per_driver, num_users, now
+):
+    rng = _seed_worker(shard_seed)
+    fleet = seeder.generate_fleet(
+        seeder.fake,
+        rng,
+        static,
+        DerivedIds(run_key, "driver", start, count),
+        trips_per_driver,
+        now,
+    )
+    # cross-shard references : passengers come from the whole run
+    bookings = seeder.generate_bookings(
+        seeder.fake,
+        rng,
+        static,
+        fleet.pop("seats"),
+        DerivedIds(run_key, "passenger", 0, num_users),
+    )
+    return seeder.merge_rows(fleet, bookings)
+
+
+# LOADERS : one pooled connection per shard
+
+
+def load_shard(db_manager, rows, label):
+    started = time.perf_counter()
+    with db_manager.connection() as conn:
+        with conn.cursor() as cur:
+            count = sum(
+                seeder.copy_rows(cur, table, columns, rows[table])
+                for table, columns in seeder.SEED_TABLES
+                if rows.get(table)
+            )
+        conn.commit()
+    logger.info(
+        f"DB SEED : {label} {count} rows in {time.perf_counter() - started:.2f}s"
+    )
+    return count
+
+
+def run_phase(processes, loaders, db_manager, tasks, dedupe, label, in_flight):
+    # generation futures are consumed in submission order, so deduplication
+    # (and therefore the dataset) does not depend on worker timing
+    pending = deque()
+    loads = deque()
+    loaded = 0
+    tasks = iter(tasks)
+
+    def submit_next():
+        task = next(tasks, None)
+        if task is not None:
+            pending.append(processes.submit(*task))
+
+    for _ in range(in_flight):
+        submit_next()
+
+    shard = 0
+    while pending:
+        rows = pending.popleft().result()
+        submit_next()
+        dedupe(rows)
+        # backpressure : never hold more generated shards than in_flight
+        while len(loads) >= in_flight:
+            loaded += loads.popleft().result()
+        loads.append(loaders.submit(load_shard, db_manager, rows, f"{label} #{shard}"))
+        shard += 1
+
+    while loads:
+        loaded += loads.popleft().result()
+    return loaded
+
+
+def seed_data_parallel(
+    db_manager,
+    num_drivers=1000,
+    num_users=1500,
+    trips_per_driver=5,
+    seed=None,
+    scale=1.0,
+    workers=None,
+    loaders=None,
+):
+    # phase 1 : people shards (passengers, then driver accounts)
+    # phase 2 : fleet shards (driver_data, vehicles, trips, passengers, reviews),
+    #           loaded once every user they can reference is committed.
+    num_drivers = max(1, round(num_drivers * scale))
+    num_users = max(1, round(num_users * scale))
+    workers = workers or os.cpu_count() or 1
+    loaders = loaders or max(1, db_manager.pool.max_size - 1)
+    rng = random.Random(seed)
+    run_key = f"seed-{seed}" if seed is not None else uuid4().hex
+    now = datetime.now()
+
+    with db_manager.connection() as conn:
+        with conn.cursor() as cur:
+            static = seeder.load_seed_static(cur)
+            taken = seeder.load_taken_values(cur)
+        conn.commit()
+
+    people_tasks = [
+        (
+            generate_people_shard,
+            rng.getrandbits(64),
+            static,
+            run_key,
+            kind,
+            start,
+            count,
+            static[role],
+        )
+        for kind, total, shard_size, role in (
+            ("passenger", num_users, SHARD_USERS, "passenger_role_id"),
+            ("driver", num_drivers, SHARD_USERS, "driver_role_id"),
+        )
+        for start, count in split_range(total, shard_size)
+    ]
+    fleet_tasks = [
+        (
+            generate_fleet_shard,
+            rng.getrandbits(64),
+            static,
+            run_key,
+            start,
+            count,
+            trips_per_driver,
+            num_users,
+            now,
+        )
+        for start, count in split_range(num_drivers, SHARD_DRIVERS)
+    ]
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as processes, ThreadPoolExecutor(
+        max_workers=loaders
+    ) as loader_pool:
+        people_rows = run_phase(
+            processes,
+            loader_pool,
+            db_manager,
+            people_tasks,
+            lambda rows: seeder.dedupe_people(rows, taken),
+            "people",
+            workers * 2,
+        )
+        fleet_rows = run_phase(
+            processes,
+            loader_pool,
+            db_manager,
+            fleet_tasks,
+            lambda rows: seeder.dedupe_fleet(rows, taken),
+            "fleet",
+            workers * 2,
+        )
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"DB SEED : {people_rows + fleet_rows} rows in {elapsed:.1f}s "
+        f"({workers} workers, {loaders} connections)"
+    )
+    return people_rows + fleet_rows
@@ -0,0 +1,2 @@
+from .distance import geodesic_distances_km, durations_min, distances_and_durations
+from .communes import CommuneIndex, get_commune_index
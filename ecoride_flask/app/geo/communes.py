@@ -0,0 +1,87 @@
+import csv
+import logging
+import math
+import threading
+from pathlib import Path
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+# French places with more than 1000 inhabitants, extracted from GeoNames
+# cities1000 (https://www.geonames.org, CC BY 4.0) : name,lat,lng
+COMMUNES_CSV = Path(__file__).parent / "data" / "communes_fr.csv"
+
+GRID_CELL_DEG = 0.1
+MAX_DISTANCE_KM = 25
+KM_PER_DEG = 111.195
+
+
+class CommuneIndex:
+    """Nearest-commune lookups over a uniform lat/lng grid.
+
+    Points are bucketed in GRID_CELL_DEG cells; a lookup scans rings of
+    cells around the query point and stops as soon as no closer point
+    can exist, so it touches a handful of cells whatever the dataset size.
+    """
+
+    def __init__(self, communes, cell_deg=GRID_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.size = 0
+        self.cells = {}
+        for name, lat, lng in communes:
+            self.cells.setdefault(self._cell(lat, lng), []).append((lat, lng, name))
+            self.size += 1
+
+    @classmethod
+    def from_csv(cls, path=COMMUNES_CSV, cell_deg=GRID_CELL_DEG):
+        with open(path, newline="", encoding="utf-8") as f:
+            communes = [
+                (row["name"], float(row["lat"]), float(row["lng"]))
+                for row in csv.DictReader(f)
+            ]
+        return cls(communes, cell_deg)
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def nearest(self, lat, lng, max_km=MAX_DISTANCE_KM):
+        # returns the closest commune name within max_km, else None
+        ci, cj = self._cell(lat, lng)
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        # narrowest side of a cell, in km (longitude shrinks with latitude)
+        cell_km = self.cell_deg * KM_PER_DEG * cos_lat
+
+        best = None
+        best_d2 = (max_km / KM_PER_DEG) ** 2
+        ring = 0
+        while True:
+            for i in range(ci - ring, ci + ring + 1):
+                for j in range(cj - ring, cj + ring + 1):
+                    if ring and ci - ring < i < ci + ring and cj - ring < j < cj + ring:
+                        continue  # inner cells were scanned by previous rings
+                    for p_lat, p_lng, name in self.cells.get((i, j), ()):
+                        d2 = (p_lat - lat) ** 2 + ((p_lng - lng) * cos_lat) ** 2
+                        if d2 < best_d2:
+                            best, best_d2 = name, d2
+            # anything in the next ring is at least ring * cell_km away
+            if ring * cell_km >= min(math.sqrt(best_d2) * KM_PER_DEG, max_km):
+                return best
+            ring += 1
+
+    def nearest_many(self, lats, lngs, max_km=MAX_DISTANCE_KM):
+        return [self.nearest(lat, lng, max_km) for lat, lng in zip(lats, lngs)]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_commune_index():
+    # loaded once per process, on first use (create_app warms it at startup)
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CommuneIndex.from_csv()
+                logger.info(f"commune index loaded : {_index.size} communes")
+    return _index
@@ -1,3 +1,4 @@
 from .form_models import RegistrationData, LoginData
 from .session_user import SessionUser
+from .session_user_cache import session_user_cache
 from .session_user_load import session_user_loader
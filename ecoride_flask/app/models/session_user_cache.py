@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+import psycopg
+from psycopg import sql
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+# notified by the accounts / users triggers (see SESSION USER CACHE in db_init.sql)
+SESSION_USER_CHANGES_CHANNEL = "session_user_changed"
+
+
+class SessionUserCache:
+    """In-process TTL + LRU cache of SessionUser objects, keyed by account id.
+
+    Writes to an account in this process invalidate it right away; every
+    other process drops it through a LISTEN on SESSION_USER_CHANGES_CHANNEL.
+    The ttl only bounds staleness while the listener is disconnected.
+    """
+
+    def __init__(self, ttl=60, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # account_id -> (expires_at, user)
+        self._by_user_id = {}  # user_id -> account_id
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener = None
+        self.listening = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def configure(self, ttl=None, max_size=None):
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if max_size is not None:
+                self.max_size = max_size
+            self._entries.clear()
+            self._by_user_id.clear()
+
+    def get(self, account_id):
+        account_id = str(account_id)
+        with self._lock:
+            entry = self._entries.get(account_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(account_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(account_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._drop(user.id)
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+            if user.user_id is not None:
+                self._by_user_id[user.user_id] = user.id
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, account_id=None, user_id=None):
+        with self._lock:
+            if account_id is None and user_id is not None:
+                account_id = self._by_user_id.get(str(user_id))
+            if account_id is not None and str(account_id) in self._entries:
+                self._drop(str(account_id))
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user_id.clear()
+
+    def listen(self, conninfo, channel=SESSION_USER_CHANGES_CHANNEL, retry_delay=5):
+        # dedicated connection outside the pool, reconnects until stop()
+        if self._listener is None:
+            self._listener = threading.Thread(
+                target=self._listen,
+                args=(conninfo, channel, retry_delay),
+                name="session-user-cache-listener",
+                daemon=True,
+            )
+            self._listener.start()
+        return self
+
+    def _listen(self, conninfo, channel, retry_delay):
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(conninfo, autocommit=True) as conn:
+                    conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+                    self.listening = True
+                    # whatever changed while disconnected was missed
+                    self.clear()
+                    while not self._stop.is_set():
+                        for notify in conn.notifies(timeout=1.0):
+                            self.invalidate(account_id=notify.payload)
+            except Exception as e:
+                logger.warning(f"session user cache listener disconnected: {e}")
+            finally:
+                self.listening = False
+            self._stop.wait(retry_delay)
+
+    def stop(self):
+        self._stop.set()
+
+    def _drop(self, account_id):
+        entry = self._entries.pop(account_id, None)
+        if entry is not None and entry[1].user_id is not None:
+            self._by_user_id.pop(entry[1].user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "listening": self.listening,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+session_user_cache = SessionUserCache()
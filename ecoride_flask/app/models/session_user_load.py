@@ -1,13 +1,22 @@
-from app.models import SessionUser
+from app.models import SessionUser, session_user_cache
 from app.utils import login_manager
 
 
 def session_user_loader(app):
+    session_user_cache.configure(
+        ttl=app.config.get("SESSION_USER_CACHE_TTL", 60),
+        max_size=app.config.get("SESSION_USER_CACHE_SIZE", 10000),
+    )
+    session_user_cache.listen(app.db_manager.conninfo)
+
     @login_manager.user_loader
     def user_loader(account_id):
-        print("Loading user:", account_id)
+        cached_user = session_user_cache.get(account_id)
+        if cached_user is not None:
+            return cached_user if cached_user.is_active else None
+
+        # shares the request connection with the view that follows
         with app.db_manager.connection() as conn:
-            conn.autocommit = True
             with conn.cursor() as cursor:
                 cursor.execute(
                     "SELECT a.id, a.email, a.account_status_id, a.account_access_id, u.id, u.username FROM accounts a LEFT JOIN users u ON u.account_id = a.id WHERE a.id = %s",
@@ -26,7 +35,7 @@ def session_user_loader(app):
                     username,
                 ) = row
 
-                return SessionUser(
+                session_user = SessionUser(
                     account_id=account_id,
                     email=email,
                     account_status_id=account_status_id,
@@ -34,3 +43,6 @@ def session_user_loader(app):
                     user_id=user_id,
                     username=username,
                 )
+                session_user_cache.put(session_user)
+                # a suspended account loses its open sessions
+                return session_user if session_user.is_active else None
@@ -2,3 +2,4 @@ from .auth import auth_bp
 from .users import users_bp
 from .drivers import drivers_bp
 from .trips import trips_bp
+from .moderation import moderation_bp
@@ -9,10 +9,18 @@ from flask import (
 )
 import json
 import logging
-from app.db_store import crud_utilities, user_crud, driver_crud
+from app.db_store import crud_utilities, user_crud, PoolExhausted
 from app.models import RegistrationData, LoginData, SessionUser
 from pydantic import ValidationError
-from app.utils import bcrypt
+from psycopg.errors import UniqueViolation
+from app.utils import (
+    password_hasher,
+    HashingBusy,
+    search_cache,
+    fragment_cache,
+    require_access,
+)
+from app.models import session_user_cache
 from flask_login import login_user, logout_user, login_required
 from app.utils.static_resolvers import static_id_resolver, static_name_resolver
 
@@ -22,6 +30,22 @@ auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
 logger = logging.getLogger(__name__)
 
 
+# unique constraint -> message shown on the registration form
+REGISTRATION_CONFLICTS = {
+    "accounts_email_key": "un compte existe déjà avec cet email. veuillez vous connecter.",
+    "users_username_key": "Nom d'utilisateur déjà pris.",
+}
+
+
+def hashing_busy_response(error):
+    messages = ["Le serveur est très sollicité. Réessayez dans quelques secondes."]
+    response = make_response(
+        render_template("partials/server_msg.html", messages=messages), 503
+    )
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
 @auth_bp.route("/health")
 def health_check():
     conn = None
@@ -31,12 +55,29 @@ def health_check():
             if result:
                 return {"status": "healthy"}, 200
 
+    except PoolExhausted as e:
+        return {"status": str(e)}, 503
+
     # IMPLEMENT LOGGING AND LOG ERORRS THERE
     except Exception as e:
         error_message = f"Database connection failed: {str(e)}"
         return {"status": error_message}, 500
 
 
+@auth_bp.route("/metrics")
+@require_access("admin")
+def metrics():
+    # process internals (pool holders, cache contents, bcrypt calibration) :
+    # admins only, any new stats go here behind the same guard
+    return {
+        "hashing": password_hasher.stats(),
+        "session_user_cache": session_user_cache.stats(),
+        "search_cache": search_cache.stats(),
+        "fragment_cache": fragment_cache.stats(),
+        "db_pool": current_app.db_manager.stats(),
+    }, 200
+
+
 @auth_bp.route("/register", methods=["POST"])
 def register_user():
     data = request.form.to_dict()
@@ -50,39 +91,32 @@ def register_user():
         role_ids = []
         for role in reg_data.roles:
             static_role = static_name_resolver("roles", role)
-            role_ids.append(str(static_role) if static_role else None)
+            if static_role:
+                role_ids.append(str(static_role))
+        with_driver = str(current_app.static_ids["roles"]["driver"]) in role_ids
 
-        with current_app.db_manager.connection() as conn:
-            existing_account = user_crud.get_user_by_email(conn, reg_data.email)
+        # hashed before the request connection is checked out
+        hashed_pw = password_hasher.generate_password_hash(reg_data.password)
 
-            if existing_account:
-                message = [
-                    "un compte existe déjà avec cet email. veuillez vous connecter."
-                ]
-                return make_response(
-                    render_template("partials/server_msg.html", message=message), 200
+        with current_app.db_manager.connection() as conn:
+            try:
+                account_id, user_id, _ = user_crud.register_account(
+                    conn,
+                    reg_data.email,
+                    hashed_pw,
+                    reg_data.username,
+                    role_ids,
+                    driver=with_driver,
                 )
-
-            if user_crud.check_username(conn, reg_data.username):
-                message = ["Nom d'utilisateur déjà pris."]
+            except UniqueViolation as uv:
+                message = REGISTRATION_CONFLICTS.get(uv.diag.constraint_name)
+                if message is None:
+                    raise
                 return make_response(
-                    render_template("partials/server_msg.html", message=message), 200
+                    render_template("partials/server_msg.html", messages=[message]),
+                    200,
                 )
 
-            hashed_pw = bcrypt.generate_password_hash(reg_data.password, 14).decode(
-                "utf-8"
-            )
-            account_id = user_crud.create_account(conn, reg_data.email, hashed_pw)
-            user_id = user_crud.create_user(conn, account_id, reg_data.username)
-
-            user_crud.set_user_roles(conn, user_id, role_ids)
-            driver_id = current_app.static_ids["roles"]["driver"]
-
-            if str(driver_id) in role_ids:
-                driver_id = driver_crud.create_driver(conn, user_id)
-                if driver_id is None:
-                    raise Exception("error while creating driver profile")
-
             session_user = SessionUser(
                 account_id=account_id,
                 email=reg_data.email,
@@ -104,6 +138,13 @@ def register_user():
             )
             return response
 
+    except PoolExhausted:
+        raise  # answered by the app-wide 503 handler
+
+    except HashingBusy as busy:
+        logger.warning("Registration rejected: hashing queue full")
+        return hashing_busy_response(busy)
+
     except ValidationError as ve:
         logger.error("Validation error during registration: %s", ve.errors())
         errors = ve.errors()
@@ -131,75 +172,109 @@ def login():
         # validate the login data
         login_data = LoginData(**data)
 
-        with current_app.db_manager.connection() as conn:
+        db_manager = current_app.db_manager
+        with db_manager.connection() as conn:
             login_response = user_crud.request_login(conn, login_data.email)
 
-            if login_response is None:
-                # if no account found, return error
-                messages = ["No account found with this email."]
-                response = make_response(
-                    render_template("partials/server_msg.html", messages=messages), 200
+            # if account found, and not suspended, try to retrieve the password hash
+            suspended = login_response is not None and (
+                static_id_resolver("account_status", login_response["account_status_id"])
+                == "suspended"
+            )
+            hashed_pw = None
+            if login_response is not None and not suspended:
+                hashed_pw = user_crud.retrieve_password(
+                    conn, account_id=login_response["id"]
                 )
-                return response
 
-            if login_response["account_status_id"] == "suspended":
-                # if account found, but not suspended, return error
-                messages = ["This account has been suspended."]
-                response = make_response(
-                    render_template("partials/server_msg.html", messages=messages), 200
-                )
-                return response
+        # bcrypt runs without holding a pool connection : a login burst
+        # waiting on the hashing queue must not starve other requests
+        db_manager.release_request_connection()
 
-            # if account found, and account_status_id != "suspended", try to retrieve the password hash
-            hashed_pw = user_crud.retrieve_password(
-                conn, account_id=login_response["id"]
+        if login_response is None:
+            # if no account found, return error
+            messages = ["No account found with this email."]
+            response = make_response(
+                render_template("partials/server_msg.html", messages=messages), 200
             )
+            return response
 
-            password_to_check = str(login_data.password)
+        if suspended:
+            # if account found, but not suspended, return error
+            messages = ["This account has been suspended."]
+            response = make_response(
+                render_template("partials/server_msg.html", messages=messages), 200
+            )
+            return response
 
-            login_ok = bcrypt.check_password_hash(hashed_pw, password_to_check)
+        password_to_check = str(login_data.password)
 
-            if not login_ok:
-                # if password does not match, return error
-                messages = ["Incorrect password."]
-                response = make_response(
-                    render_template("partials/server_msg.html", messages=messages), 200
-                )
-                return response
+        login_ok = password_hasher.check_password_hash(hashed_pw, password_to_check)
+
+        if not login_ok:
+            # if password does not match, return error
+            messages = ["Incorrect password."]
+            response = make_response(
+                render_template("partials/server_msg.html", messages=messages), 200
+            )
+            return response
+
+        # transparent upgrade : hashes outside the current cost policy
+        # are replaced while we still hold the plaintext
+        new_hash = None
+        if password_hasher.needs_rehash(hashed_pw):
+            try:
+                new_hash = password_hasher.generate_password_hash(password_to_check)
+            except HashingBusy:
+                logger.info("Rehash skipped: hashing queue full")
+
+        with db_manager.connection() as conn:
+            if new_hash is not None:
+                user_crud.update_password_hash(conn, login_response["id"], new_hash)
+                password_hasher.rehashed += 1
 
             session_user = user_crud.get_user_object(conn, login_response["id"])
 
-            login_user(session_user)
+        db_manager.release_request_connection()
 
-            # resolve access level
+        login_user(session_user)
 
-            access_level = static_id_resolver(
-                "account_access", session_user.account_access_id
+        # resolve access level
+
+        access_level = static_id_resolver(
+            "account_access", session_user.account_access_id
+        )
+
+        response = make_response(
+            render_template(
+                "partials/server_msg.html",
+                messages=["Connexion réussie, redirection..."],
             )
+        )
 
-            response = make_response(
-                render_template(
-                    "partials/server_msg.html",
-                    messages=["Connexion réussie, redirection..."],
-                )
+        if access_level == "admin":
+            url = url_for("pages.admin_dashboard")
+        elif access_level == "moderator":
+            url = url_for("pages.moderator_dashboard")
+        elif access_level == "user" and session_user.user_id is not None:
+            url = url_for("pages.profile", user_id=session_user.user_id)
+        elif access_level == "user" and session_user.user_id is None:
+            url = url_for("pages.onboard")
+        else:
+            logging.warning(
+                f"Unexpected login redirect state: access={access_level}, user_id={session_user.user_id}"
             )
+            url = url_for("pages.index")  # fallback
 
-            if access_level == "admin":
-                url = url_for("pages.admin_dashboard")
-            elif access_level == "moderator":
-                url = url_for("pages.moderator_dashboard")
-            elif access_level == "user" and session_user.user_id is not None:
-                url = url_for("pages.profile", user_id=session_user.user_id)
-            elif access_level == "user" and session_user.user_id is None:
-                url = url_for("pages.onboard")
-            else:
-                logging.warning(
-                    f"Unexpected login redirect state: access={access_level}, user_id={session_user.user_id}"
-                )
-                url = url_for("pages.index")  # fallback
+        response.headers["HX-Trigger"] = json.dumps({"redirectTo": url})
+        return response
 
-            response.headers["HX-Trigger"] = json.dumps({"redirectTo": url})
-            return response
+    except PoolExhausted:
+        raise  # answered by the app-wide 503 handler
+
+    except HashingBusy as busy:
+        logger.warning("Login rejected: hashing queue full")
+        return hashing_busy_response(busy)
 
     except ValidationError as ve:
         logger.error("Validation error during login: %s", ve.errors())
@@ -8,7 +8,11 @@ from flask import (
 import logging
 from app.db_store import driver_crud
 from flask_login import login_required, current_user
-from app.utils.custom_decorators import htmx_login_required, require_ownership
+from app.utils.custom_decorators import (
+    htmx_login_required,
+    require_ownership,
+    conditional_get,
+)
 
 drivers_bp = Blueprint("drivers", __name__, url_prefix="/drivers")
 
@@ -16,27 +20,23 @@ drivers_bp = Blueprint("drivers", __name__, url_prefix="/drivers")
 logger = logging.getLogger(__name__)
 
 
+def driver_data_version(user_id):
+    with current_app.db_manager.connection() as conn:
+        version = driver_crud.get_driver_version(conn, user_id)
+    owner = str(current_user.user_id) == str(user_id)
+    return f"driver:{user_id}:{version}:{owner}"
+
+
 @drivers_bp.route("/driver_data/<user_id>")
 @htmx_login_required
 @require_ownership("user_id")
+@conditional_get(driver_data_version)
 def get_driver_data(user_id):
     user_id = request.view_args.get("user_id")
     owner = str(current_user.user_id) == str(user_id)
 
-    driver_info = {}
     with current_app.db_manager.connection() as conn:
-        driver_data = driver_crud.get_driver_data(conn, user_id)
-
-        if driver_data:
-            driver_id = driver_data["id"]
-            driver_preferences = driver_crud.get_driver_preferences(conn, driver_id)
-            driver_vehicles = driver_crud.get_driver_vehicles(conn, driver_id)
-
-            driver_info = {
-                "data": driver_data,
-                "preferences": driver_preferences,
-                "vehicles": driver_vehicles,
-            }
+        driver_info = driver_crud.get_driver_info(conn, user_id)
 
     return render_template(
         "partials/driver_info.html",
@@ -50,12 +50,10 @@ def get_driver_data(user_id):
 @require_ownership("user_id")
 def edit_driver_preferences():
     with current_app.db_manager.connection() as conn:
-        driver_data = driver_crud.get_driver_data(conn, current_user.user_id)
-        driver_id = driver_data["id"] if driver_data else None
-
         if request.method == "GET":
-            prefs = driver_crud.get_driver_preferences(conn, driver_id)
-            all_prefs = driver_crud.get_all_driver_preferences(conn)
+            prefs, all_prefs = driver_crud.get_preferences_form(
+                conn, current_user.user_id
+            )
 
             return render_template(
                 "partials/driver_preferences_form.html",
@@ -67,12 +65,7 @@ def edit_driver_preferences():
         driver_id = driver_data["id"] if driver_data else None
 
         new_prefs = request.form.getlist("preferences")
-        print(f"New preferences from form: {new_prefs}")
-        driver_crud.set_driver_preferences(conn, driver_id, new_prefs)
-
-        # Re-fetch updated prefs for display
-        updated_prefs = driver_crud.get_driver_preferences(conn, driver_id)
-        print(f"Updated preferences: {updated_prefs}")
+        updated_prefs = driver_crud.set_driver_preferences(conn, driver_id, new_prefs)
         return render_template(
             "partials/driver_preferences.html", preferences=updated_prefs, owner=True
         )
@@ -84,8 +77,7 @@ def edit_driver_preferences():
 def add_vehicle():
     if request.method == "GET":
         with current_app.db_manager.connection() as conn:
-            brands = driver_crud.get_vehicle_brands(conn)
-            energy_types = driver_crud.get_energy_types(conn)
+            brands, energy_types = driver_crud.get_vehicle_form_options(conn)
         return render_template(
             "partials/add_vehicle_form.html", brands=brands, energy_types=energy_types
         )
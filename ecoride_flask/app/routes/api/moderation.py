@@ -0,0 +1,114 @@
+from flask import (
+    current_app,
+    Blueprint,
+    request,
+    render_template,
+)
+import logging
+from uuid import UUID
+from flask_login import current_user
+from app.db_store import mod_crud
+from app.utils import require_access
+from app.utils.static_resolvers import static_name_resolver
+from app.utils.pagination import encode_cursor, decode_cursor
+
+moderation_bp = Blueprint("moderation", __name__, url_prefix="/moderation")
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+# decision buttons -> message shown above the claimed reviews
+DECISION_MESSAGES = {
+    "approved": "avis approuvé(s).",
+    "rejected": "avis rejeté(s).",
+}
+
+
+def render_claimed(conn, messages=None):
+    reviews = mod_crud.get_claimed_reviews(
+        conn, static_name_resolver("review_status", "pending"), current_user.id
+    )
+    return render_template(
+        "partials/claimed_reviews.html", reviews=reviews, messages=messages
+    )
+
+
+@moderation_bp.route("/queue")
+@require_access("moderator", "admin")
+def review_queue():
+    try:
+        after = decode_cursor(request.args.get("cursor"))
+    except ValueError:
+        return "Invalid cursor", 400
+
+    with current_app.db_manager.connection() as conn:
+        reviews, next_after = mod_crud.get_pending_reviews(
+            conn, static_name_resolver("review_status", "pending"), after=after
+        )
+
+    return render_template(
+        "partials/review_queue.html",
+        reviews=reviews,
+        next_cursor=encode_cursor(*next_after) if next_after else None,
+    )
+
+
+@moderation_bp.route("/claim", methods=["POST"])
+@require_access("moderator", "admin")
+def claim_reviews():
+    with current_app.db_manager.connection() as conn:
+        claimed = mod_crud.claim_reviews(
+            conn,
+            static_name_resolver("review_status", "pending"),
+            current_user.id,
+            count=current_app.config["MOD_CLAIM_SIZE"],
+            lease=current_app.config["MOD_CLAIM_LEASE_SECONDS"],
+        )
+        messages = None if claimed else ["Aucun avis en attente."]
+        return render_claimed(conn, messages)
+
+
+@moderation_bp.route("/decide", methods=["POST"])
+@require_access("moderator", "admin")
+def decide_reviews():
+    decision = request.form.get("decision")
+    review_ids = request.form.getlist("review_ids")
+
+    if decision not in DECISION_MESSAGES:
+        return "Invalid decision", 400
+
+    try:
+        review_ids = [str(UUID(review_id)) for review_id in review_ids]
+    except ValueError:
+        return "Invalid review id", 400
+
+    with current_app.db_manager.connection() as conn:
+        if not review_ids:
+            return render_claimed(conn, ["Aucun avis sélectionné."])
+
+        decided = mod_crud.moderate_reviews(
+            conn,
+            static_name_resolver("review_status", "pending"),
+            current_user.id,
+            review_ids,
+            static_name_resolver("review_status", decision),
+        )
+
+        messages = [f"{len(decided)} {DECISION_MESSAGES[decision]}"]
+        if len(decided) < len(review_ids):
+            # lease expired and the review went to another moderator
+            messages.append(
+                f"{len(review_ids) - len(decided)} avis n'étaient plus réservés."
+            )
+        return render_claimed(conn, messages)
+
+
+@moderation_bp.route("/release", methods=["POST"])
+@require_access("moderator", "admin")
+def release_reviews():
+    with current_app.db_manager.connection() as conn:
+        released = mod_crud.release_claims(
+            conn, static_name_resolver("review_status", "pending"), current_user.id
+        )
+        logger.info(f"Moderator {current_user.id} released {released} reviews")
+        return render_claimed(conn)
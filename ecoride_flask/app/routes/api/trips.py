@@ -1,16 +1,19 @@
-from app.utils import htmx_login_required
+from app.utils import htmx_login_required, conditional_get, search_cache
 from flask import (
     current_app,
     Blueprint,
     request,
     render_template,
+    make_response,
 )
+import json
 import logging
 from app.db_store import driver_crud, trips_crud
 from datetime import datetime
 from flask_login import login_required, current_user
 from app.utils.static_resolvers import static_name_resolver
 from app.utils.custom_decorators import require_ownership
+from app.utils.pagination import encode_cursor, decode_cursor
 
 trips_bp = Blueprint("trips", __name__, url_prefix="/trips")
 
@@ -24,25 +27,93 @@ def create_trip():
     return render_template("pages/create_trip.html", page_wrap="create_trip")
 
 
+def search_version(**_):
+    # database search generation, shared by every process : changes with any
+    # trip_search write. The date bucket covers "now" searches moving forward
+    # without any write.
+    version = search_cache.version()
+    if version is None:
+        return None
+    start_date = request.args.get("start_date") or datetime.now().isoformat()
+    return f"search:{version}:{trips_crud.search_date_bucket(start_date)}:{request.query_string.decode()}"
+
+
 @trips_bp.route("/query_trips")
+@conditional_get(search_version)
 def query_trips():
     start_city = request.args.get("start_city")
     end_city = request.args.get("end_city")
     start_date = request.args.get("start_date") or datetime.now().isoformat()
     passenger_nr = request.args.get("passenger_nr")
 
-    with current_app.db_manager.connection() as conn:
-        results = trips_crud.search_summaries_asst(
-            conn,
-            start_city,
-            end_city,
-            passenger_nr,
-            start_date,
-        )
+    try:
+        after = decode_cursor(request.args.get("cursor"))
+    except ValueError:
+        return "Invalid cursor", 400
+
+    results, next_after = trips_crud.cached_search_summaries(
+        current_app.db_manager,
+        start_city,
+        end_city,
+        passenger_nr,
+        start_date,
+        after=after,
+    )
 
+    search_args = {
+        "start_city": start_city,
+        "end_city": end_city,
+        "start_date": start_date,
+        "passenger_nr": passenger_nr,
+    }
+    next_cursor = encode_cursor(*next_after) if next_after else None
+
+    # next pages are appended in place of the load-more sentinel
+    template = "partials/trip_cards.html" if after else "partials/trip_results.html"
     return render_template(
-        "partials/trip_results.html", page_wrap="query_trips", trips=results
+        template,
+        page_wrap="query_trips",
+        trips=results,
+        next_cursor=next_cursor,
+        search_args=search_args,
+    )
+
+
+# book_trip result -> message shown under the card
+BOOKING_MESSAGES = {
+    "booked": "Réservation confirmée !",
+    "already_booked": "Vous avez déjà réservé ce voyage.",
+    "full": "Ce voyage est complet.",
+    "insufficient_credits": "Crédits insuffisants pour ce voyage.",
+    "own_trip": "Vous ne pouvez pas réserver votre propre voyage.",
+    "unavailable": "Ce voyage n'est plus disponible.",
+}
+
+
+@trips_bp.route("/<uuid:trip_id>/book", methods=["POST"])
+@htmx_login_required
+def book_trip(trip_id):
+    with current_app.db_manager.connection() as conn:
+        result, seats_left = trips_crud.book_trip(conn, trip_id, current_user.user_id)
+
+    logger.info(f"Booking {trip_id} by {current_user.user_id} : {result}")
+    # 200 in every case so htmx swaps the message, the outcome is in the event
+    response = make_response(
+        render_template(
+            "partials/server_msg.html", messages=[BOOKING_MESSAGES[result]]
+        ),
+        200,
+    )
+    response.headers["HX-Trigger"] = json.dumps(
+        {
+            "tripBooking": {
+                "trip_id": str(trip_id),
+                "result": result,
+                "seats_left": seats_left,
+            }
+        }
     )
+    return response
 
 
 @trips_bp.route("/view_trip/<trip_id>")
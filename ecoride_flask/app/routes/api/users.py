@@ -9,8 +9,13 @@ from flask import (
 import logging
 from app.db_store import user_crud
 from flask_login import login_required, current_user
-from app.utils.static_resolvers import static_id_resolver
-from app.utils.custom_decorators import htmx_login_required, require_ownership
+from app.utils.static_resolvers import static_id_resolver, static_name_resolver
+from app.utils.custom_decorators import (
+    htmx_login_required,
+    require_ownership,
+    require_access,
+    conditional_get,
+)
 
 users_bp = Blueprint("users", __name__, url_prefix="/users")
 
@@ -35,19 +40,14 @@ def edit_roles():
 
         elif request.method == "POST":
             new_roles = request.form.getlist("roles")
-
-            print(f"New roles from form: {new_roles}")
             new_roles_ids = [
                 role_id
                 for role_id in new_roles
                 if static_id_resolver("roles", role_id) is not None
             ]
 
-            print(f"New roles IDs: {new_roles_ids}")
-
-            worked = user_crud.set_user_roles(conn, current_user.user_id, new_roles_ids)
-
-            print(f"Roles update worked: {worked}")
+            roles = user_crud.set_user_roles(conn, current_user.user_id, new_roles_ids)
+            logger.info(f"Roles of {current_user.user_id} set to {roles}")
 
             response = make_response("", 204)
             response.headers["HX-Redirect"] = url_for(
@@ -56,10 +56,39 @@ def edit_roles():
             return response
 
 
+def credits_version(**_):
+    # the balance is a single number : it is its own validator
+    with current_app.db_manager.connection() as conn:
+        credits = user_crud.get_user_credits(conn, current_user.user_id)
+    return f"credits:{current_user.user_id}:{credits}"
+
+
+# no ownership check : only ever reads the current user's own balance
 @users_bp.route("/get_account_credits")
 @htmx_login_required
-@require_ownership("user_id")
+@conditional_get(credits_version)
 def get_account_credits():
     with current_app.db_manager.connection() as conn:
         credits = user_crud.get_user_credits(conn, current_user.user_id)
     return render_template("partials/credits_fragment.html", credits=credits)
+
+
+@users_bp.route("/accounts/<uuid:account_id>/status", methods=["POST"])
+@require_access("admin")
+def set_account_status(account_id):
+    # suspend / reactivate an account : its sessions are dropped in every
+    # worker on their next request
+    status = request.form.get("status")
+    status_id = static_name_resolver("account_status", status) if status else None
+    if status_id is None:
+        return "Invalid status", 400
+
+    with current_app.db_manager.connection() as conn:
+        updated = user_crud.set_account_status(conn, account_id, status_id)
+    if not updated:
+        return "Account not found", 404
+
+    logger.info(f"Account {account_id} set to {status} by {current_user.id}")
+    return render_template(
+        "partials/server_msg.html", messages=[f"Compte mis à jour : {status}."]
+    )
@@ -6,9 +6,10 @@ from flask import (
 )
 from datetime import datetime
 from flask_login import login_required, current_user
-from app.utils import static_id_resolver
-from app.db_store import user_crud, trips_crud
+from app.utils import static_id_resolver, static_name_resolver, require_access
+from app.db_store import user_crud, trips_crud, admin_crud, mod_crud
 from app.faker.villes import villes
+from app.utils.pagination import encode_cursor, decode_cursor
 
 pages_bp = Blueprint("pages", __name__, template_folder="../templates")
 
@@ -63,24 +64,68 @@ def search_trips():
     start_date = request.args.get("start_date") or datetime.now().isoformat()
     passenger_nr = request.args.get("passenger_nr")
 
+    try:
+        after = decode_cursor(request.args.get("cursor"))
+    except ValueError:
+        # same answer as the other keyset endpoints
+        return "Invalid cursor", 400
+
     # NEED TO ESCAPE SMTH ?
-    with current_app.db_manager.connection() as conn:
-        trips = trips_crud.search_summaries_asst(
-            conn,
-            start_city=start_city,
-            end_city=end_city,
-            passenger_nr=passenger_nr,
-            start_date=start_date,
-        )
+    trips, next_after = trips_crud.cached_search_summaries(
+        current_app.db_manager,
+        start_city=start_city,
+        end_city=end_city,
+        passenger_nr=passenger_nr,
+        start_date=start_date,
+        after=after,
+    )
 
     return render_template(
         "pages/search_trips.html",
         page_wrap="search_trips",
         trips=trips,
+        next_cursor=encode_cursor(*next_after) if next_after else None,
+        search_args={
+            "start_city": start_city,
+            "end_city": end_city,
+            "start_date": start_date,
+            "passenger_nr": passenger_nr,
+        },
         cities=list(villes.keys()),
     )
 
 
+@pages_bp.route("/admin")
+@require_access("admin")
+def admin_dashboard():
+    with current_app.db_manager.connection() as conn:
+        stats = admin_crud.get_dashboard(conn)
+
+    return render_template(
+        "pages/admin_dashboard.html", page_wrap="admin_dashboard", stats=stats
+    )
+
+
+@pages_bp.route("/moderator")
+@require_access("moderator", "admin")
+def moderator_dashboard():
+    pending_id = static_name_resolver("review_status", "pending")
+
+    with current_app.db_manager.connection() as conn:
+        pending_count = mod_crud.count_pending_reviews(conn, pending_id)
+        claimed = mod_crud.get_claimed_reviews(conn, pending_id, current_user.id)
+        reviews, next_after = mod_crud.get_pending_reviews(conn, pending_id)
+
+    return render_template(
+        "pages/moderator_dashboard.html",
+        page_wrap="moderator_dashboard",
+        pending_count=pending_count,
+        claimed=claimed,
+        reviews=reviews,
+        next_cursor=encode_cursor(*next_after) if next_after else None,
+    )
+
+
 @pages_bp.route("/contact")
 def contact():
     return render_template("pages/contact.html", page_wrap="contact")
@@ -1,5 +1,15 @@
 from .extensions import bcrypt, login_manager
+from .hashing import password_hasher, HashingBusy, bcrypt_cost
 from .static_resolvers import static_id_resolver, static_name_resolver
+from .static_registry import StaticIdRegistry, StaticIdsUnavailable
+from .background import PeriodicTask
+from .search_cache import search_cache
+from .fragment_cache import fragment_cache
 from .safe_close import safe_close
-from .custom_decorators import htmx_login_required, require_ownership
+from .custom_decorators import (
+    htmx_login_required,
+    require_ownership,
+    require_access,
+    conditional_get,
+)
 from .custom_filters import fr_date
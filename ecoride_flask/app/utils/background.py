@@ -0,0 +1,34 @@
+import logging
+import threading
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Runs `fn` every `interval` seconds on a daemon thread until stopped."""
+
+    def __init__(self, name, interval, fn):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(
+                target=self._run, name=self.name, daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.fn()
+            except Exception as e:
+                logger.error(f"{self.name} failed: {e}")
+
+    def stop(self):
+        self._stop.set()
@@ -1,6 +1,8 @@
+import hashlib
 from functools import wraps
 from flask import abort, redirect, url_for, request, make_response
 from flask_login import current_user
+from app.utils.static_resolvers import static_id_resolver
 
 
 def htmx_login_required(f):
@@ -30,3 +32,48 @@ def require_ownership(param="user_id"):
         return wrapper
 
     return decorator
+
+
+def require_access(*levels):
+    # account_access names allowed through, e.g. require_access("admin")
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not current_user.is_authenticated:
+                return redirect(url_for("pages.login"))
+            access = static_id_resolver("account_access", current_user.account_access_id)
+            if access not in levels:
+                abort(403)
+            return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def conditional_get(validator):
+    # ETag / If-None-Match : validator(**view_kwargs) returns a cheap version
+    # string of the data the view renders (row version, counter, ...), or None
+    # to skip. A matching If-None-Match gets a 304 before the view runs.
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            version = validator(**kwargs)
+            if version is None:
+                return f(*args, **kwargs)
+            etag = hashlib.blake2b(version.encode("utf-8"), digest_size=12).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            # cached by the browser only, and always revalidated
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+from flask import current_app
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """In-process LRU cache of rendered partials, capped in bytes.
+
+    A fragment is keyed by its template and the version of the data it was
+    rendered from (e.g. trip_search.version), so a data change is simply a
+    new key : nothing is invalidated, old versions age out of the LRU.
+    Exposed to templates as cached_fragment(template, version_key, **context).
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (template, key) -> html
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_bytes=None):
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._entries.clear()
+            self._bytes = 0
+
+    def render(self, template_name, key, **context):
+        entry_key = (template_name, key)
+        with self._lock:
+            html = self._entries.get(entry_key)
+            if html is not None:
+                self._entries.move_to_end(entry_key)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        # rendered outside the lock : two requests may both render a miss,
+        # the second put just replaces an identical fragment
+        html = Markup(
+            current_app.jinja_env.get_template(template_name).render(**context)
+        )
+        if self.max_bytes > 0:
+            self._put(entry_key, html)
+        return html
+
+    def _put(self, entry_key, html):
+        with self._lock:
+            previous = self._entries.pop(entry_key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[entry_key] = html
+            self._bytes += len(html)
+            while self._bytes > self.max_bytes:
+                _, oldest = self._entries.popitem(last=False)
+                self._bytes -= len(oldest)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+fragment_cache = FragmentCache()
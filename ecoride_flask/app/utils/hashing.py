@@ -0,0 +1,155 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt as bcrypt_lib
+from app.utils.extensions import bcrypt
+from app.utils.metrics import LatencyHistogram
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+BCRYPT_COST_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+def bcrypt_cost(pw_hash):
+    # "$2b$12$..." -> 12, None for anything that is not a bcrypt hash
+    match = BCRYPT_COST_RE.match(pw_hash or "")
+    return int(match.group(1)) if match else None
+
+
+class HashPolicy:
+    """Which bcrypt cost new hashes get, and which stored hashes are stale.
+
+    calibrate() times bcrypt on this host and keeps the highest cost whose
+    hash fits the latency budget, never going below min_rounds. Each process
+    calibrates on its own and may land one cost apart from its neighbours,
+    so a stored hash is only stale below min_rounds or more than tolerance
+    away from this process's cost.
+    """
+
+    def __init__(self, rounds=12, min_rounds=10, max_rounds=14, tolerance=1):
+        self.rounds = rounds
+        self.min_rounds = min_rounds
+        self.max_rounds = max_rounds
+        self.tolerance = tolerance
+        self.measured_ms = {}
+
+    def calibrate(self, budget_ms):
+        chosen = self.min_rounds
+        self.measured_ms = {}
+        for rounds in range(self.min_rounds, self.max_rounds + 1):
+            started = time.perf_counter()
+            bcrypt_lib.hashpw(b"calibration", bcrypt_lib.gensalt(rounds))
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.measured_ms[rounds] = round(elapsed_ms, 1)
+            if elapsed_ms > budget_ms:
+                break
+            chosen = rounds
+        self.rounds = chosen
+        logger.info(
+            f"bcrypt cost calibrated : {chosen} (budget {budget_ms}ms, "
+            f"measured {self.measured_ms})"
+        )
+        return chosen
+
+    def needs_rehash(self, pw_hash):
+        cost = bcrypt_cost(pw_hash)
+        if cost is None or cost < self.min_rounds:
+            return True
+        return abs(cost - self.rounds) > self.tolerance
+
+
+class HashingBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__("password hashing queue is full")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Runs bcrypt off the request thread, on a small dedicated pool.
+
+    At most pool_size hashes run at once and queue_depth more may wait;
+    anything beyond that raises HashingBusy right away, so a burst of
+    sign-ups / logins cannot tie up every request worker.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self.retry_after = 2
+        self.rejected = 0
+        self.wait_latency = LatencyHistogram()
+        self.hash_latency = LatencyHistogram()
+        self.policy = HashPolicy()
+        self.rehashed = 0
+
+    def init_app(self, app):
+        pool_size = app.config.get("HASH_POOL_SIZE", 2)
+        queue_depth = app.config.get("HASH_QUEUE_DEPTH", 8)
+        self.retry_after = app.config.get("HASH_RETRY_AFTER", 2)
+        self._executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="bcrypt"
+        )
+        self._slots = threading.BoundedSemaphore(pool_size + queue_depth)
+
+        self.policy = HashPolicy(
+            rounds=app.config.get("HASH_ROUNDS") or 12,
+            min_rounds=app.config.get("HASH_MIN_ROUNDS", 10),
+            max_rounds=app.config.get("HASH_MAX_ROUNDS", 14),
+            tolerance=app.config.get("HASH_REHASH_TOLERANCE", 1),
+        )
+        # a fixed HASH_ROUNDS wins over calibration
+        if not app.config.get("HASH_ROUNDS"):
+            self.policy.calibrate(app.config.get("HASH_LATENCY_BUDGET_MS", 250))
+
+    def _timed(self, queued_at, fn, *args):
+        started = time.perf_counter()
+        self.wait_latency.observe(started - queued_at)
+        try:
+            return fn(*args)
+        finally:
+            self.hash_latency.observe(time.perf_counter() - started)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingBusy(self.retry_after)
+        try:
+            future = self._executor.submit(self._timed, time.perf_counter(), fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def generate_password_hash(self, password, rounds=None):
+        rounds = rounds or self.policy.rounds
+        return self._run(bcrypt.generate_password_hash, password, rounds).decode(
+            "utf-8"
+        )
+
+    def needs_rehash(self, pw_hash):
+        return self.policy.needs_rehash(pw_hash)
+
+    def check_password_hash(self, pw_hash, password):
+        return self._run(bcrypt.check_password_hash, pw_hash, password)
+
+    def stats(self):
+        return {
+            "rounds": self.policy.rounds,
+            "rehash_tolerance": self.policy.tolerance,
+            "calibration_ms": self.policy.measured_ms,
+            "rehashed": self.rehashed,
+            "rejected": self.rejected,
+            "queue_wait": self.wait_latency.snapshot(),
+            "hash": self.hash_latency.snapshot(),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,23 @@
+import base64
+from datetime import datetime
+from uuid import UUID
+
+
+# opaque keyset cursor : "<start_time iso>|<trip_id>" in urlsafe base64
+def encode_cursor(start_time, trip_id):
+    if isinstance(start_time, str):
+        start_time = datetime.fromisoformat(start_time)
+    raw = f"{start_time.isoformat()}|{trip_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        start_time, trip_id = raw.split("|", 1)
+        return datetime.fromisoformat(start_time), UUID(trip_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
@@ -1,5 +1,19 @@
+from app.utils.hashing import password_hasher
+from app.utils.search_cache import search_cache
+from app.models import session_user_cache
+
+
 def safe_close(app):
     try:
+        password_hasher.shutdown()
+        search_cache.stop()
+        session_user_cache.stop()
+        if hasattr(app, "static_ids"):
+            app.static_ids.stop()
+        if hasattr(app, "credits_settlement"):
+            app.credits_settlement.stop()
+        if hasattr(app, "admin_stats"):
+            app.admin_stats.stop()
         if hasattr(app, "db_manager"):
             app.db_manager.close_all()
     except Exception as e:
@@ -0,0 +1,223 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+import psycopg
+from psycopg import sql
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+# notified by the trip_search triggers (see SEARCH CACHE in db_init.sql)
+SEARCH_CHANGES_CHANNEL = "trip_search_changed"
+
+
+class _Flight:
+    # one in-progress load, shared by every request asking for the same key
+    __slots__ = ("generation", "done", "ok", "value")
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.done = threading.Event()
+        self.ok = False
+        self.value = None
+
+
+class SearchCache:
+    """In-process LRU cache of search results, capped in bytes.
+
+    Any write that reaches trip_search bumps the generation, which drops
+    every entry : locally right after the write, and in every other process
+    through a LISTEN on SEARCH_CHANGES_CHANNEL. Loads started before a bump
+    are not stored. Concurrent misses on one key run a single load, the
+    other requests wait for its result. The ttl only bounds staleness while
+    the listener is disconnected. Notifications carry the database's search
+    generation, shared by every process, from which the results' validator
+    is derived.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=60, load_timeout=10):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.load_timeout = load_timeout
+        self.generation = 0
+        # highest trip_search_generation_seq value notified, and the
+        # validator derived from the notifications : same in every process
+        # listening since before the same write
+        self.db_generation = None
+        self._validator = None
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._inflight = {}  # key -> _Flight
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener = None
+        self.listening = False
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.bumps = 0
+
+    def configure(self, max_bytes=None, ttl=None):
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if ttl is not None:
+                self.ttl = ttl
+            self._clear()
+
+    def get_or_load(self, key, loader):
+        if self.max_bytes <= 0 or self.ttl <= 0:
+            return loader()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                self._drop(key)
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight(self.generation)
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if flight.done.wait(self.load_timeout) and flight.ok:
+                return flight.value
+            # the leading load failed or is stuck : run our own
+            return loader()
+
+        try:
+            value = loader()
+            flight.value, flight.ok = value, True
+            self._put(key, value, flight.generation)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def version(self):
+        # validator of every search result, None while other processes'
+        # writes could go unnoticed
+        if not self.listening:
+            return None
+        return self._validator
+
+    def bump(self):
+        with self._lock:
+            self.generation += 1
+            self.bumps += 1
+            self._clear()
+
+    def _advance(self, db_generation):
+        # a notified write : generations are drawn before commit, so a
+        # transaction may commit after a higher one. Its late value still
+        # changes the validator, as "<highest>.<late>".
+        self.bump()
+        with self._lock:
+            if db_generation is None:
+                self._validator = None
+            elif self.db_generation is None or db_generation > self.db_generation:
+                self.db_generation = db_generation
+                self._validator = str(db_generation)
+            else:
+                self._validator = f"{self.db_generation}.{db_generation}"
+
+    def _connected(self, last_value):
+        # transactions holding a generation up to last_value may still be
+        # uncommitted : the "~" form never matches a validator of a process
+        # that saw them commit, until the next write realigns everyone
+        self.bump()
+        with self._lock:
+            self.db_generation = last_value
+            self._validator = None if last_value is None else f"{last_value}~"
+
+    def _put(self, key, value, generation):
+        size = len(json.dumps(value, default=str))
+        with self._lock:
+            # written meanwhile : the result may already be stale
+            if generation != self.generation or size > self.max_bytes:
+                return
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def listen(self, conninfo, channel=SEARCH_CHANGES_CHANNEL, retry_delay=5):
+        # dedicated connection outside the pool, reconnects until stop()
+        if self._listener is None:
+            self._listener = threading.Thread(
+                target=self._listen,
+                args=(conninfo, channel, retry_delay),
+                name="search-cache-listener",
+                daemon=True,
+            )
+            self._listener.start()
+        return self
+
+    def _listen(self, conninfo, channel, retry_delay):
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(conninfo, autocommit=True) as conn:
+                    conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+                    row = conn.execute(
+                        "SELECT last_value FROM trip_search_generation_seq"
+                    ).fetchone()
+                    # whatever changed while disconnected was missed
+                    self._connected(row[0] if row else None)
+                    self.listening = True
+                    while not self._stop.is_set():
+                        for notify in conn.notifies(timeout=1.0):
+                            self._advance(
+                                int(notify.payload) if notify.payload.isdigit() else None
+                            )
+            except Exception as e:
+                logger.warning(f"search cache listener disconnected: {e}")
+            finally:
+                self.listening = False
+                self._validator = None
+            self._stop.wait(retry_delay)
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "generation": self.generation,
+                "db_generation": self.db_generation,
+                "validator": self._validator,
+                "listening": self.listening,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "bumps": self.bumps,
+            }
+
+
+search_cache = SearchCache()
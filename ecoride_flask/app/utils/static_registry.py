@@ -0,0 +1,88 @@
+import logging
+import time
+from uuid import UUID
+from app.utils.background import PeriodicTask
+
+# MODULE LOGGER
+logger = logging.getLogger(__name__)
+
+
+class StaticIdsUnavailable(Exception):
+    pass
+
+
+class StaticIdSnapshot:
+    # immutable view of the reference tables, both directions
+    def __init__(self, ids):
+        self.by_name = {category: dict(names) for category, names in ids.items()}
+        self.by_id = {
+            category: {UUID(str(_id)): name for name, _id in names.items()}
+            for category, names in ids.items()
+        }
+
+
+class StaticIdRegistry:
+    """Name <-> id lookups for the static reference tables.
+
+    Lookups hit a prebuilt snapshot (dicts in both directions, UUID keys);
+    a background task reloads the tables and swaps the snapshot in one
+    assignment, so readers never see a half-built registry.
+    Still usable like the old dict : registry["roles"]["driver"].
+    """
+
+    def __init__(self, loader, refresh_interval=300):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._refresher = None
+
+    def load(self, retries=3, delay=1.0):
+        # initial load : retry briefly, then fail fast instead of serving
+        # requests without reference ids
+        for attempt in range(1, retries + 1):
+            try:
+                self._snapshot = StaticIdSnapshot(self.loader())
+                return self
+            except Exception as e:
+                logger.warning(f"static ids load attempt {attempt} failed: {e}")
+                if attempt < retries:
+                    time.sleep(delay * attempt)
+        raise StaticIdsUnavailable(
+            f"static ids could not be loaded after {retries} attempts"
+        )
+
+    def refresh(self):
+        snapshot = StaticIdSnapshot(self.loader())
+        if snapshot.by_name != self._snapshot.by_name:
+            self._snapshot = snapshot
+            logger.info("static ids refreshed")
+
+    def start_refresh(self):
+        self._refresher = PeriodicTask(
+            "static-ids-refresh", self.refresh_interval, self.refresh
+        ).start()
+        return self
+
+    def stop(self):
+        if self._refresher is not None:
+            self._refresher.stop()
+
+    def name_for(self, category, target_id):
+        if isinstance(target_id, UUID):
+            key = target_id
+        else:
+            try:
+                key = UUID(str(target_id))
+            except ValueError:
+                return None
+        return self._snapshot.by_id.get(category, {}).get(key)
+
+    def id_for(self, category, name):
+        return self._snapshot.by_name.get(category, {}).get(name)
+
+    # dict compatibility
+    def __getitem__(self, category):
+        return self._snapshot.by_name[category]
+
+    def get(self, category, default=None):
+        return self._snapshot.by_name.get(category, default)
@@ -2,13 +2,8 @@ from flask import current_app
 
 
 def static_id_resolver(category, target_id):
-    ids = current_app.static_ids.get(category, {})
-    for name, _id in ids.items():
-        if str(target_id) == str(_id):
-            return name
-    return None
+    return current_app.static_ids.name_for(category, target_id)
 
 
 def static_name_resolver(category, target_name):
-    ids = current_app.static_ids.get(category, {})
-    return ids.get(target_name)
+    return current_app.static_ids.id_for(category, target_name)
@@ -0,0 +1,154 @@
+"""Seat booking under contention.
+
+Creates a throwaway trip, lets --clients distinct users book it at the same
+instant through trips_crud.book_trip, then checks that the seats booked never
+exceed the vehicle capacity and that the counter matches trip_passengers.
+Payments are reversed in the ledger when the trip is removed.
+
+    cd ecoride_flask
+    python -m benchmarks.booking_contention --clients 300 --connections 50
+
+Needs a seeded database (users, drivers and vehicles) reachable with the
+settings from config.db_config.
+"""
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app.db_store import DatabaseManager, trips_crud
+from config import db_config
+
+
+def create_trip(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO trips (driver_id, vehicle_id, start_location, end_location, start_time, price, trip_status)
+            SELECT v.driver_id, v.id, t.start_location, t.end_location, %s, 10,
+                   (SELECT id FROM trip_status WHERE name = 'pending')
+            FROM vehicles v
+            JOIN trips t ON t.vehicle_id = v.id
+            LIMIT 1
+            RETURNING id, driver_id
+            """,
+            (datetime.now() + timedelta(days=7),),
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise SystemExit("no vehicle with trips found, seed the database first")
+        trip_id, driver_id = row
+        cur.execute("SELECT capacity FROM trip_seats WHERE trip_id = %s", (trip_id,))
+        capacity = cur.fetchone()[0]
+        conn.commit()
+    return trip_id, driver_id, capacity
+
+
+def pick_users(conn, driver_id, count):
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT u.id FROM users u WHERE u.id <> (SELECT user_id FROM driver_data WHERE id = %s) LIMIT %s",
+            (driver_id, count),
+        )
+        users = [row[0] for row in cur.fetchall()]
+        conn.commit()
+    if len(users) < count:
+        raise SystemExit(f"only {len(users)} users available, need {count}")
+    return users
+
+
+def run_round(db_manager, trip_id, users):
+    barrier = threading.Barrier(len(users))
+
+    def client(user_id):
+        barrier.wait()
+        started = time.perf_counter()
+        with db_manager.connection() as conn:
+            result, _ = trips_crud.book_trip(conn, trip_id, user_id)
+        return result, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(users)) as clients:
+        outcomes = list(clients.map(client, users))
+    return outcomes, time.perf_counter() - started
+
+
+def check(conn, trip_id, capacity):
+    with conn.cursor() as cur:
+        cur.execute("SELECT booked FROM trip_seats WHERE trip_id = %s", (trip_id,))
+        counter = cur.fetchone()[0]
+        cur.execute(
+            "SELECT COUNT(*) FROM trip_passengers WHERE trip_id = %s", (trip_id,)
+        )
+        rows = cur.fetchone()[0]
+        conn.commit()
+    return counter, rows, rows <= capacity and counter == rows
+
+
+def remove_trip(conn, trip_id):
+    # the ledger is append-only : payments are reversed, not deleted
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO credit_ledger (user_id, amount, kind, idempotency_key)
+            SELECT user_id, -amount, 'benchmark_reversal', 'reversal:' || idempotency_key
+            FROM credit_ledger WHERE trip_id = %s
+            ON CONFLICT (idempotency_key) DO NOTHING
+            """,
+            (trip_id,),
+        )
+        cur.execute("DELETE FROM trips WHERE id = %s", (trip_id,))
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="keep the test trips")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(
+        {**db_config, "min_conn": args.connections, "max_conn": args.connections}
+    )
+    db_manager.acquire_timeout = 60
+    db_manager.pool.wait()
+
+    ok = True
+    try:
+        for n in range(args.rounds):
+            with db_manager.connection() as conn:
+                trip_id, driver_id, capacity = create_trip(conn)
+                users = pick_users(conn, driver_id, args.clients)
+
+            outcomes, elapsed = run_round(db_manager, trip_id, users)
+            results = Counter(result for result, _ in outcomes)
+            latencies = sorted(latency * 1000 for _, latency in outcomes)
+
+            with db_manager.connection() as conn:
+                counter, rows, consistent = check(conn, trip_id, capacity)
+                if not args.keep:
+                    remove_trip(conn, trip_id)
+
+            ok = ok and consistent and results["booked"] == min(capacity, args.clients)
+            print(
+                f"round {n + 1}: capacity {capacity}, {dict(results)}, "
+                f"rows {rows}, counter {counter}, "
+                f"{'OK' if consistent else 'OVERSOLD / DRIFT'} | "
+                f"{len(outcomes) / elapsed:.0f} bookings/s, "
+                f"p50 {statistics.median(latencies):.1f}ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f}ms"
+            )
+    finally:
+        db_manager.close_all()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,10 +15,64 @@ class Config:
     SESSION_COOKIE_SECURE = False
     SESSION_COOKIE_SAMESITE = "Lax"
 
+    # Session user cache (per process)
+    SESSION_USER_CACHE_TTL = int(os.getenv("SESSION_USER_CACHE_TTL", 60))
+    SESSION_USER_CACHE_SIZE = int(os.getenv("SESSION_USER_CACHE_SIZE", 10000))
+
+    # Password hashing pool (bcrypt runs off the request thread)
+    HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", 2))
+    HASH_QUEUE_DEPTH = int(os.getenv("HASH_QUEUE_DEPTH", 8))
+    HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", 2))
+
+    # bcrypt cost : calibrated at startup to fit the latency budget,
+    # unless HASH_ROUNDS pins it
+    HASH_ROUNDS = int(os.getenv("HASH_ROUNDS", 0))
+    HASH_LATENCY_BUDGET_MS = int(os.getenv("HASH_LATENCY_BUDGET_MS", 250))
+    HASH_MIN_ROUNDS = int(os.getenv("HASH_MIN_ROUNDS", 10))
+    HASH_MAX_ROUNDS = int(os.getenv("HASH_MAX_ROUNDS", 14))
+    # stored hashes within this many rounds of the calibrated cost are kept,
+    # so processes calibrated one cost apart do not rehash each other's logins
+    HASH_REHASH_TOLERANCE = int(os.getenv("HASH_REHASH_TOLERANCE", 1))
+
+    # Static reference ids
+    STATIC_IDS_REFRESH_SECONDS = int(os.getenv("STATIC_IDS_REFRESH_SECONDS", 300))
+    STATIC_IDS_LOAD_RETRIES = int(os.getenv("STATIC_IDS_LOAD_RETRIES", 3))
+
+    # Credits ledger settlement (folds postings into users.credits)
+    CREDITS_SETTLE_INTERVAL = int(os.getenv("CREDITS_SETTLE_INTERVAL", 5))
+    CREDITS_SETTLE_BATCH = int(os.getenv("CREDITS_SETTLE_BATCH", 5000))
+
+    # Admin dashboard counters (active drivers, ...) refresh period
+    ADMIN_STATS_REFRESH_SECONDS = int(os.getenv("ADMIN_STATS_REFRESH_SECONDS", 300))
+
+    # Trip search result cache (per process, dropped on any trip_search write)
+    SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 60))
+
+    # Rendered fragment cache (trip cards, keyed by row version)
+    FRAGMENT_CACHE_MAX_BYTES = int(
+        os.getenv("FRAGMENT_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+    )
+
+    # Review moderation : reviews handed out per claim, and how long a
+    # moderator keeps them before they go back to the queue
+    MOD_CLAIM_SIZE = int(os.getenv("MOD_CLAIM_SIZE", 20))
+    MOD_CLAIM_LEASE_SECONDS = int(os.getenv("MOD_CLAIM_LEASE_SECONDS", 600))
+
+    # Seeding (empty DB only)
+    SEED_RANDOM_SEED = (
+        int(os.getenv("SEED_RANDOM_SEED")) if os.getenv("SEED_RANDOM_SEED") else None
+    )
+    SEED_SCALE = float(os.getenv("SEED_SCALE", 1))
+
 
 db_config = {
     "min_conn": int(os.getenv("DB_POOL_MIN_CONN", 1)),
     "max_conn": int(os.getenv("DB_POOL_MAX_CONN", 10)),
+    # seconds a request waits for a connection before failing with a 503
+    "acquire_timeout": float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", 3)),
+    # checkouts held longer than this are logged with the view holding them
+    "slow_hold_ms": int(os.getenv("DB_POOL_SLOW_HOLD_MS", 500)),
     "db_user": os.getenv("DB_USER"),
     "db_password": os.getenv("DB_PASSWORD"),
     "db_host": os.getenv("DB_HOST"),
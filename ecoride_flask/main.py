@@ -1,16 +1,35 @@
-from flask import Flask
+from flask import Flask, render_template, make_response
 from rich.logging import RichHandler
 import logging
-from app.db_store import DatabaseManager, crud_utilities, trips_crud
+from app.db_store import (
+    DatabaseManager,
+    PoolExhausted,
+    admin_crud,
+    crud_utilities,
+    credits_crud,
+    trips_crud,
+)
 from app.routes import pages_bp
-from app.routes.api import auth_bp, users_bp, drivers_bp, trips_bp
+from app.routes.api import auth_bp, users_bp, drivers_bp, trips_bp, moderation_bp
 from config import db_config, Config
-from app.utils import bcrypt, login_manager, safe_close, fr_date
+from app.utils import (
+    bcrypt,
+    password_hasher,
+    login_manager,
+    safe_close,
+    fr_date,
+    StaticIdRegistry,
+    StaticIdsUnavailable,
+    PeriodicTask,
+    search_cache,
+    fragment_cache,
+)
 from app.models import session_user_loader
 import atexit
 from datetime import datetime
 import locale
 from app.faker import seed_data
+from app.geo import get_commune_index
 
 # Might raise error on some systems, TEST FOR DOCKER
 locale.setlocale(locale.LC_TIME, "fr_FR.UTF-8")
@@ -23,6 +42,7 @@ def create_app():
     )
 
     app.jinja_env.filters["fr_date"] = fr_date
+    app.jinja_env.globals["cached_fragment"] = fragment_cache.render
 
     # CONTEXT PROCESSOR TEST
     # use to inject variables into templates globally
@@ -42,18 +62,30 @@ def create_app():
 
     app.config.from_object(Config)
     bcrypt.init_app(app)
+    password_hasher.init_app(app)
     db_manager = DatabaseManager(db_config)
+    db_manager.init_app(app)
     app.db_manager = db_manager
 
     logging.info(
         f"[bold green]TIME NOW : {datetime.now().strftime('%d %B %Y - %H:%Mhs')}[/bold green]"
     )
 
+    # reverse geocoding index, loaded once before any summary is built
+    get_commune_index()
+
+    # fail fast : without reference ids every request would error
     try:
-        app.static_ids = crud_utilities.load_static_ids(db_manager)
+        app.static_ids = StaticIdRegistry(
+            lambda: crud_utilities.load_static_ids(db_manager),
+            refresh_interval=app.config["STATIC_IDS_REFRESH_SECONDS"],
+        ).load(retries=app.config["STATIC_IDS_LOAD_RETRIES"])
+        app.static_ids.start_refresh()
         logging.info("static ids loaded ~")
-    except Exception as e:
+    except StaticIdsUnavailable as e:
         logging.error(f"failed to load static ids: {str(e)}")
+        db_manager.close_all()
+        raise
 
     try:
         with db_manager.connection() as conn:
@@ -62,7 +94,14 @@ def create_app():
                 user_count = cur.fetchone()[0]
                 conn.commit()
             if user_count < 10:
-                seed_data(conn, num_drivers=1000, num_users=3000, trips_per_driver=5)
+                seed_data(
+                    conn,
+                    num_drivers=1000,
+                    num_users=3000,
+                    trips_per_driver=5,
+                    seed=app.config["SEED_RANDOM_SEED"],
+                    scale=app.config["SEED_SCALE"],
+                )
                 logging.info("DB SEED : Database seeded.")
             else:
                 logging.info("DB SEED : Seeding skipped: users already exist.")
@@ -76,17 +115,54 @@ def create_app():
                     "BATCH SUMMARIES: Summary generation skipped: data already present."
                 )
 
+        # dashboard counters available right away, then every refresh period
+        admin_crud.refresh_rollups(db_manager)
+
     except Exception as e:
         logging.error(f"❌ Seeding error: {e}")
 
+    app.credits_settlement = PeriodicTask(
+        "credits-settlement",
+        app.config["CREDITS_SETTLE_INTERVAL"],
+        lambda: credits_crud.settle_all(
+            db_manager, batch_size=app.config["CREDITS_SETTLE_BATCH"]
+        ),
+    ).start()
+
+    app.admin_stats = PeriodicTask(
+        "admin-stats",
+        app.config["ADMIN_STATS_REFRESH_SECONDS"],
+        lambda: admin_crud.refresh_rollups(db_manager),
+    ).start()
+
+    # search results are cached per process, every trip_search write
+    # (here or in another worker) drops them
+    search_cache.configure(
+        max_bytes=app.config["SEARCH_CACHE_MAX_BYTES"],
+        ttl=app.config["SEARCH_CACHE_TTL"],
+    )
+    search_cache.listen(db_manager.conninfo)
+    fragment_cache.configure(max_bytes=app.config["FRAGMENT_CACHE_MAX_BYTES"])
+
     login_manager.init_app(app)
     session_user_loader(app)
 
+    # pool backpressure : fail fast instead of queueing behind busy connections
+    @app.errorhandler(PoolExhausted)
+    def pool_exhausted(error):
+        messages = ["Le serveur est très sollicité. Réessayez dans quelques secondes."]
+        response = make_response(
+            render_template("partials/server_msg.html", messages=messages), 503
+        )
+        response.headers["Retry-After"] = str(error.retry_after)
+        return response
+
     app.register_blueprint(pages_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(users_bp)
     app.register_blueprint(drivers_bp)
     app.register_blueprint(trips_bp)
+    app.register_blueprint(moderation_bp)
 
     login_manager.login_view = "pages.login"
 